@@ -0,0 +1,439 @@
+# System Libs.
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Other Libs
+import numpy as np
+import pandas as pd
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader
+
+import settings
+import transform
+from checkpoint import build_model
+
+MEAN, STD = (0.56019358, 0.52410121, 0.501457), (0.23318603, 0.24300033, 0.24567522)
+
+
+def make_synthetic_images(root, num_images=64, size=(512, 384), seed=0):
+    """
+    Write synthetic JPEGs with the real train image shape, so benchmarks need no dataset.
+
+    Args:
+        root (str): Directory to write images to.
+        num_images (int, optional): Number of images. Defaults to 64.
+        size (sequence, optional): (height, width). Defaults to (512, 384).
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        img_paths (list): Image paths.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size
+    img_paths = []
+    for i in range(num_images):
+        # smooth gradients + noise compress like photos, unlike pure noise
+        base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None] * rng.random(3, dtype=np.float32)
+        noise = rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        img_path = os.path.join(root, f"{i:05d}.jpg")
+        Image.fromarray(pixels).save(img_path, quality=95)
+        img_paths.append(img_path)
+    return img_paths
+
+
+def _images_per_sec(fn, items, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def bench_transforms(img_paths, resize=(512, 384), names=None):
+    """
+    Measure decode + transform images/sec in a single process(= per DataLoader worker).
+
+    Args:
+        img_paths (sequence): JPEG paths.
+        resize (sequence, optional): Resize size. Defaults to (512, 384).
+        names (sequence, optional): Transform class names in transform.py. Defaults to all image transforms.
+
+    Returns:
+        result (dict): Images/sec per transform.
+    """
+    names = names or [
+        "BaseTransform",
+        "CustomTransform",
+        "FastBaseTransform",
+        "FastCustomTransform",
+        "BatchBaseTransform",
+    ]
+    result = {}
+    for name in names:
+        trf = getattr(transform, name)(resize=resize, mean=MEAN, std=STD)
+        result[name] = _images_per_sec(lambda img_path: trf(Image.open(img_path)), img_paths)
+    return result
+
+
+def synthetic_dataset(img_paths, transform_name="BaseTransform", resize=(512, 384), seed=0):
+    """MaskBaseDataset over synthetic images with random 18-class labels."""
+    from dataset import MaskBaseDataset
+
+    labels = np.random.default_rng(seed).integers(0, 18, len(img_paths))
+    dataset = MaskBaseDataset(pd.DataFrame({"FullPath": img_paths, "Class": labels}), mean=MEAN, std=STD)
+    dataset.set_transform(getattr(transform, transform_name)(resize=resize, mean=MEAN, std=STD))
+    return dataset
+
+
+def bench_getitem(img_paths, resize=(512, 384), names=None):
+    """
+    Measure MaskBaseDataset.__getitem__ items/sec with each transform in a single process.
+
+    Returns:
+        result (dict): Items/sec per transform.
+    """
+    names = names or ["BaseTransform", "CustomTransform", "FastBaseTransform", "BatchBaseTransform"]
+    result = {}
+    for name in names:
+        dataset = synthetic_dataset(img_paths, name, resize=resize)
+        result[name] = _images_per_sec(dataset.__getitem__, range(len(dataset)))
+    return result
+
+
+def bench_dataloader(
+    img_paths, resize=(512, 384), worker_counts=(0, 1, 2, 4), batch_size=16, transform_name="BaseTransform"
+):
+    """
+    Measure DataLoader images/sec over one pass per worker count, worker start-up included.
+
+    Returns:
+        result (dict): Images/sec per "workers_{n}".
+    """
+    dataset = synthetic_dataset(img_paths, transform_name, resize=resize)
+    result = {}
+    for num_workers in worker_counts:
+        loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers, shuffle=False)
+        start = time.perf_counter()
+        for _ in loader:
+            pass
+        result[f"workers_{num_workers}"] = len(dataset) / (time.perf_counter() - start)
+    return result
+
+
+def bench_models(
+    model_names=("BaseModel", "ResNet18Pretrained", "MultiTaskResNet18"),
+    batch_sizes=(16, 64),
+    resize=(512, 384),
+    steps=3,
+    device=torch.device("cpu"),
+):
+    """
+    Measure fp32 forward + backward + optimizer images/sec per model and batch size.
+
+    Returns:
+        result (dict): Images/sec per "model/batch_{n}".
+    """
+    result = {}
+    for batch_size in batch_sizes:
+        measured = bench_precision(
+            model_names,
+            ("fp32",),
+            ("contiguous_format",),
+            batch_size=batch_size,
+            resize=resize,
+            steps=steps,
+            device=device,
+        )
+        for key, images_per_sec in measured.items():
+            result[f"{key.split('/')[0]}/batch_{batch_size}"] = images_per_sec
+    return result
+
+
+def bench_losses(batch_size=64, steps=50, repeat=5, device=torch.device("cpu")):
+    """
+    Measure forward + backward time of each loss.py criterion on 18-class logits.
+    The steps are timed `repeat` times and the best run is reported, a single run of these tiny
+    tensors is noisier than compare_baseline's tolerance.
+
+    Returns:
+        result (dict): Milliseconds per step, per criterion.
+    """
+    import loss
+
+    kwargs = {"label_smoothing": dict(classes=18, smoothing=0.1), "f1": dict(classes=18)}
+    criterions = {
+        name: loss.get_criterion(name, **kwargs.get(name, {})) for name in loss._criterion_entrypoints
+    }
+    criterions["multitask"] = loss.MultiTaskLoss()
+    labels = torch.randint(0, 18, (batch_size,), device=device)
+    result = {}
+    for name, criterion in criterions.items():
+        num_outputs = 8 if name == "multitask" else 18
+        outs = torch.randn(batch_size, num_outputs, device=device, requires_grad=True)
+        criterion = criterion.to(device)
+        criterion(outs, labels).backward()  # warm up
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(steps):
+                criterion(outs, labels).backward()
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            best = min(best, time.perf_counter() - start)
+        result[name] = dict(ms=best / steps * 1000)
+    return result
+
+
+def bench_voting(root, file_counts=(10, 50, 200), num_rows=12600, seed=0):
+    """
+    Measure voting/ensemble.py hard voting(csv) and soft voting(float16 score arrays) time against N files.
+
+    Returns:
+        result (dict): Milliseconds per "hard/files_{n}" and "soft/files_{n}".
+    """
+    from voting.ensemble import ensemble_preds, scores_path
+
+    rng = np.random.default_rng(seed)
+    image_ids = [f"{i:040x}.jpg" for i in range(num_rows)]
+    result = {}
+    for num_files in file_counts:
+        pred_dir = os.path.join(root, f"preds_{num_files}")
+        os.makedirs(pred_dir, exist_ok=True)
+        for i in range(num_files):
+            csv_path = os.path.join(pred_dir, f"{i:04d}.csv")
+            pd.DataFrame({"ImageID": image_ids, "ans": rng.integers(0, 18, num_rows)}).to_csv(
+                csv_path, index=False
+            )
+            np.save(
+                scores_path(csv_path, "probs"),
+                rng.random((num_rows, 18), dtype=np.float32).astype(np.float16),
+            )
+        save_path = os.path.join(root, "_ensemble_result.csv")
+        for kind, soft in (("hard", False), ("soft", True)):
+            start = time.perf_counter()
+            ensemble_preds(pred_dir, save_path, soft=soft)
+            result[f"{kind}/files_{num_files}"] = dict(ms=(time.perf_counter() - start) * 1000)
+    return result
+
+
+def compare_baseline(result, baseline, tolerance=0.1):
+    """
+    Compare a result with a stored baseline result.
+    Leaves named `ms` or starting with `cost` are lower-is-better, other numbers are throughputs.
+
+    Args:
+        result (dict): Current benchmark result.
+        baseline (dict): Baseline benchmark result(same structure).
+        tolerance (float, optional): Relative slowdown reported as a regression. Defaults to 0.1.
+
+    Returns:
+        comparison (dict): baseline, current and speedup(>1 is faster) per leaf path.
+        regressions (list): Leaf paths slower than the baseline by more than tolerance.
+    """
+    comparison, regressions = {}, []
+
+    def _walk(current, base, path):
+        for key, value in current.items():
+            if key not in base or key in ("env", "views", "comparison", "regressions"):
+                continue
+            if isinstance(value, dict) and isinstance(base[key], dict):
+                _walk(value, base[key], path + [key])
+                continue
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (value, base[key])):
+                continue
+            lower_is_better = key == "ms" or key.startswith("cost")
+            speedup = base[key] / value if lower_is_better else value / base[key]
+            name = "/".join(path + [key])
+            comparison[name] = dict(baseline=base[key], current=value, speedup=speedup)
+            if speedup < 1 - tolerance:
+                regressions.append(name)
+
+    _walk(result, baseline, [])
+    return comparison, regressions
+
+
+def bench_precision(
+    model_names=("BaseModel", "ResNet18Pretrained"),
+    precisions=("fp32", "bf16", "fp16"),
+    memory_formats=("contiguous_format", "channels_last"),
+    batch_size=16,
+    resize=(512, 384),
+    steps=5,
+    device=torch.device("cpu"),
+):
+    """
+    Measure training step(forward, loss, backward, optimizer) images/sec per precision and memory format.
+
+    Returns:
+        result (dict): Images/sec per "model/precision/memory_format".
+    """
+    images = torch.randn(batch_size, 3, *resize, device=device)
+    labels = torch.randint(0, 18, (batch_size,), device=device)
+    from loss import MultiTaskLoss
+
+    result = {}
+    for model_name in model_names:
+        for memory_format in memory_formats:
+            for precision in precisions:
+                fmt = getattr(torch, memory_format)
+                model = build_model(model_name).to(device, memory_format=fmt)
+                # multi-head models train on [mask | gender | age] logits
+                criterion = MultiTaskLoss() if hasattr(model, "head_sizes") else torch.nn.CrossEntropyLoss()
+                optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+                autocast = settings.get_autocast(device, precision)
+                scaler = settings.get_grad_scaler(device, precision)
+                inputs = images.contiguous(memory_format=fmt)
+
+                def step():
+                    with autocast():
+                        loss = criterion(model(inputs), labels)
+                    optimizer.zero_grad()
+                    scaler.scale(loss).backward()
+                    scaler.step(optimizer)
+                    scaler.update()
+
+                step()  # warm up
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                start = time.perf_counter()
+                for _ in range(steps):
+                    step()
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                elapsed = time.perf_counter() - start
+                result[f"{model_name}/{precision}/{memory_format}"] = batch_size * steps / elapsed
+    return result
+
+
+@torch.no_grad()
+def bench_tta(
+    model_names=("ResNet18Pretrained",),
+    view_sets=None,
+    batch_size=16,
+    resize=(512, 384),
+    steps=5,
+    device=torch.device("cpu"),
+):
+    """
+    Measure inference images/sec per TTA view set(transform.BatchTTA), views built on the device batch.
+
+    Returns:
+        result (dict): images/sec, views and slowdown per view against no TTA, per "model/view_set".
+    """
+    view_sets = view_sets or list(transform.BatchTTA.view_sets)
+    images = torch.randn(batch_size, 3, *resize, device=device)
+    result = {}
+    for model_name in model_names:
+        model = build_model(model_name).to(device).eval()
+        base = None
+        for views in view_sets:
+            tta = transform.BatchTTA(views)
+            step = lambda: tta.merge(model(tta(images)))
+            step()  # warm up
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+            for _ in range(steps):
+                step()
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            images_per_sec = batch_size * steps / (time.perf_counter() - start)
+            base = base or images_per_sec
+            result[f"{model_name}/{views}"] = dict(
+                images_per_sec=images_per_sec, views=len(tta), cost_per_view=base / images_per_sec / len(tta)
+            )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_images", type=int, default=64, help="number of synthetic images (default: 64)")
+    parser.add_argument(
+        "--resize", nargs=2, type=int, default=(512, 384), help="resize size (default: (512, 384))"
+    )
+    parser.add_argument(
+        "--suite",
+        nargs="+",
+        default=["transform", "getitem", "dataloader", "model", "loss", "voting"],
+        choices=["transform", "getitem", "dataloader", "model", "loss", "voting", "precision", "tta"],
+        help="benchmarks to run (default: transform getitem dataloader model loss voting)",
+    )
+    parser.add_argument(
+        "--precision",
+        nargs="+",
+        default=["fp32", "bf16", "fp16"],
+        help="precisions for the precision benchmark (default: fp32 bf16 fp16)",
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=16, help="batch size for model benchmarks (default: 16)"
+    )
+    parser.add_argument(
+        "--batch_sizes", nargs="+", type=int, default=[16, 64], help="batch sizes for the model suite"
+    )
+    parser.add_argument(
+        "--workers", nargs="+", type=int, default=[0, 1, 2, 4], help="worker counts for the dataloader suite"
+    )
+    parser.add_argument(
+        "--vote_files", nargs="+", type=int, default=[10, 50, 200], help="file counts for the voting suite"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--output", type=str, default="", help="save the result as json")
+    parser.add_argument("--baseline", type=str, default="", help="compare with a saved result json")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="relative slowdown reported as regression (default: 0.1)"
+    )
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    result = dict(
+        env=dict(
+            torch=torch.__version__,
+            device=str(device),
+            cpu_count=os.cpu_count(),
+            threads=torch.get_num_threads(),
+            resize=list(args.resize),
+        )
+    )
+    with tempfile.TemporaryDirectory() as root:
+        img_paths = []
+        if {"transform", "getitem", "dataloader"} & set(args.suite):
+            img_paths = make_synthetic_images(root, num_images=args.num_images, seed=args.seed)
+        if "transform" in args.suite:
+            result["transform"] = bench_transforms(img_paths, resize=args.resize)
+        if "getitem" in args.suite:
+            result["getitem"] = bench_getitem(img_paths, resize=args.resize)
+        if "dataloader" in args.suite:
+            result["dataloader"] = bench_dataloader(
+                img_paths, resize=args.resize, worker_counts=args.workers, batch_size=args.batch_size
+            )
+        if "voting" in args.suite:
+            result["voting"] = bench_voting(root, file_counts=args.vote_files, seed=args.seed)
+    if "model" in args.suite:
+        result["model"] = bench_models(batch_sizes=args.batch_sizes, resize=args.resize, device=device)
+    if "loss" in args.suite:
+        result["loss"] = bench_losses(device=device)
+    if "precision" in args.suite:
+        result["precision"] = bench_precision(
+            precisions=args.precision, batch_size=args.batch_size, resize=args.resize, device=device
+        )
+    if "tta" in args.suite:
+        result["tta"] = bench_tta(batch_size=args.batch_size, resize=args.resize, device=device)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison, regressions = compare_baseline(result, json.load(f), tolerance=args.tolerance)
+        result["comparison"] = comparison
+        result["regressions"] = regressions
+
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
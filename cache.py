@@ -0,0 +1,237 @@
+# System Libs.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+# Other Libs
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+
+class ImageCache:
+    """
+    Persistent cache of decoded and pre-resized images.
+    Every image is decoded and resized once into a uint8 array of shape (N, H, W, 3) that is
+    memory-mapped from disk, so later epochs and runs skip JPEG decoding and resizing entirely.
+    The cache is keyed by the source metadata file, the image path list and the resize size, and
+    is invalidated when any source file changes (size or modification time).
+
+    Args:
+        cache_dir (str or pathlib.Path): Parent directory for cache entries.
+        img_paths (sequence): Image paths, in the order they are stored in the cache.
+        resize (sequence): (height, width) that images are resized to.
+        source (str or pathlib.Path, optional): Metadata file the paths come from. Defaults to None.
+    """
+
+    def __init__(self, cache_dir, img_paths, resize, source=None):
+        self.img_paths = [str(p) for p in img_paths]
+        self.resize = tuple(int(s) for s in resize)
+        self.source = str(source) if source else "paths"
+        self.root = Path(cache_dir).joinpath(self.make_key(self.source, self.img_paths, self.resize))
+        self._index = {p: i for i, p in enumerate(self.img_paths)}
+        self._images = None
+
+    @classmethod
+    def from_info(cls, data_info, cache_dir, resize, path_col="FullPath"):
+        """
+        Create cache over every image of a TrainInfo.
+
+        Args:
+            data_info (TrainInfo): Metadata of the whole dataset (before split).
+            cache_dir (str or pathlib.Path): Parent directory for cache entries.
+            resize (sequence): (height, width) that images are resized to.
+            path_col (str, optional): Path column. Defaults to "FullPath".
+
+        Returns:
+            cache (ImageCache): Image cache (not built yet).
+        """
+        return cls(cache_dir, data_info.data[path_col], resize, source=data_info.file_dir)
+
+    @staticmethod
+    def make_key(source, img_paths, resize):
+        """
+        Build the cache entry name from the metadata file, image paths and resize size.
+
+        Returns:
+            key (str): Cache entry name.
+        """
+        digest = hashlib.sha1()
+        digest.update(str(resize).encode())
+        digest.update("\n".join(img_paths).encode())
+        return f"{Path(source).stem}_{resize[0]}x{resize[1]}_{digest.hexdigest()[:12]}"
+
+    @property
+    def image_file(self):
+        return self.root.joinpath("images.npy")
+
+    @property
+    def manifest_file(self):
+        return self.root.joinpath("manifest.json")
+
+    def fingerprint(self):
+        """
+        Hash of the size and modification time of every source image.
+
+        Returns:
+            fingerprint (str): Hex digest.
+        """
+        digest = hashlib.sha1()
+        for path in self.img_paths:
+            stat = os.stat(path)
+            digest.update(f"{path}\t{stat.st_size}\t{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def is_valid(self):
+        """
+        Check whether the cache exists and matches the current source files.
+
+        Returns:
+            valid (bool): Whether the cache can be used as is.
+        """
+        if not (self.manifest_file.exists() and self.image_file.exists()):
+            return False
+        with open(self.manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return (
+            manifest.get("num_images") == len(self.img_paths)
+            and tuple(manifest.get("resize", ())) == self.resize
+            and manifest.get("fingerprint") == self.fingerprint()
+        )
+
+    def build(self, num_workers=None):
+        """
+        Decode and resize every image into the memory-mapped array.
+
+        Args:
+            num_workers (int, optional): Number of decoding processes. Defaults to cpu count.
+
+        Returns:
+            self (ImageCache): Built cache.
+        """
+        num_workers = num_workers or multiprocessing.cpu_count()
+        self.root.mkdir(parents=True, exist_ok=True)
+        height, width = self.resize
+        tmp_file = self.image_file.with_suffix(".tmp.npy")
+        images = np.lib.format.open_memmap(
+            tmp_file, mode="w+", dtype=np.uint8, shape=(len(self.img_paths), height, width, 3)
+        )
+        del images
+
+        chunk_size = 64
+        jobs = [
+            (str(tmp_file), start, self.img_paths[start : start + chunk_size], self.resize)
+            for start in range(0, len(self.img_paths), chunk_size)
+        ]
+        print(f"Building image cache at {self.root}...")
+        with multiprocessing.Pool(num_workers) as pool:
+            for _ in tqdm(pool.imap_unordered(_decode_chunk, jobs), total=len(jobs)):
+                pass
+
+        os.replace(tmp_file, self.image_file)
+        manifest = dict(
+            source=self.source,
+            num_images=len(self.img_paths),
+            resize=self.resize,
+            fingerprint=self.fingerprint(),
+        )
+        with open(self.manifest_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+        self._images = None
+        return self
+
+    def load_or_build(self, num_workers=None):
+        """
+        Use the cache if it is valid, otherwise (re)build it.
+
+        Returns:
+            self (ImageCache): Usable cache.
+        """
+        if not self.is_valid():
+            self.build(num_workers=num_workers)
+        return self
+
+    @property
+    def images(self):
+        """Memory-mapped (N, H, W, 3) uint8 array, opened lazily in each process."""
+        if self._images is None:
+            self._images = np.load(self.image_file, mmap_mode="r")
+        return self._images
+
+    def indices(self, img_paths):
+        """
+        Map image paths to their cache indices.
+
+        Args:
+            img_paths (sequence): Image paths.
+
+        Returns:
+            indices (np.ndarray): Cache index of each path.
+        """
+        return np.array([self._index[str(p)] for p in img_paths], dtype=np.int64)
+
+    def read(self, cache_index):
+        """
+        Read a cached image.
+
+        Args:
+            cache_index (int): Cache index.
+
+        Returns:
+            image (Image): Decoded and resized image.
+        """
+        return Image.fromarray(np.asarray(self.images[cache_index]))
+
+    def __len__(self):
+        return len(self.img_paths)
+
+    def __getstate__(self):
+        # Memory maps are reopened in DataLoader workers instead of being pickled.
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+
+def _decode_chunk(job):
+    """Decode and resize a chunk of images into the cache file (runs in a worker process)."""
+    image_file, start, img_paths, (height, width) = job
+    images = np.load(image_file, mmap_mode="r+")
+    for offset, img_path in enumerate(img_paths):
+        image = Image.open(img_path).convert("RGB").resize((width, height), Image.BICUBIC)
+        images[start + offset] = np.asarray(image)
+    images.flush()
+
+
+if __name__ == "__main__":
+    from info import TrainInfo
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file_dir", type=str, default="")
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train/images"),
+    )
+    parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument("--cache_dir", type=str, default="./cache", help="cache directory (default: ./cache)")
+    parser.add_argument(
+        "--resize",
+        nargs=2,
+        type=int,
+        default=(512, 384),
+        help="resize size for cached images (default: (512, 384))",
+    )
+    parser.add_argument("--num_workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--check", type=bool, default=False, help="only check whether the cache is valid")
+    args = parser.parse_args()
+
+    data_info = TrainInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset)
+    cache = ImageCache.from_info(data_info, args.cache_dir, args.resize)
+    if args.check:
+        print(f"{cache.root}: {'valid' if cache.is_valid() else 'stale or missing'}")
+    else:
+        cache.load_or_build(num_workers=args.num_workers)
+        print(f"Cached {len(cache)} images at {cache.root}")
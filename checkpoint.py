@@ -0,0 +1,261 @@
+# System Libs.
+import inspect
+import os
+import pickle
+import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+# Other Libs
+import numpy as np
+import torch
+
+CHECKPOINT_FORMAT = "state_dict"
+STATE_FORMAT = "train_state"
+STATE_FILE = "state.pt"
+
+
+def unwrap(model):
+    """Strip DataParallel / DistributedDataParallel wrappers."""
+    return getattr(model, "module", model)
+
+
+def is_quantized(model):
+    """Whether a model contains quantized(int8) modules, whose kernels only run on CPU."""
+    return any("quantized" in type(module).__module__.split(".") for module in model.modules())
+
+
+def build_model(model_name, num_classes=18, pretrained=False):
+    """Build a model.py model, without downloading pretrained weights by default."""
+    Model = getattr(import_module("model"), model_name)
+    kwargs = {"pretrained": pretrained} if "pretrained" in inspect.signature(Model).parameters else {}
+    return Model(num_classes=num_classes, **kwargs)
+
+
+def snapshot(model, half=False):
+    """
+    Copy a model's state_dict to CPU memory.
+
+    Args:
+        model (nn.Module): Model, wrappers are stripped.
+        half (bool, optional): Store floating point tensors as float16. Defaults to False.
+
+    Returns:
+        state_dict (dict): CPU tensors.
+    """
+    state_dict = {}
+    for key, value in unwrap(model).state_dict().items():
+        value = value.detach()
+        if half and value.is_floating_point():
+            value = value.half()
+        state_dict[key] = value.to("cpu", copy=True)
+    return state_dict
+
+
+def to_cpu(obj):
+    """Copy every tensor of a (nested) state dict to CPU memory, so training can keep updating the originals."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+
+def rng_state():
+    """States of the python, numpy, torch and cuda random generators."""
+    state = dict(python=random.getstate(), numpy=np.random.get_state(), torch=torch.get_rng_state())
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def find_state(paths):
+    """
+    First full training state among paths that loads and has the expected format.
+
+    Args:
+        paths (sequence): Candidate state files, most preferred first.
+
+    Returns:
+        path (str): State file path, None if no candidate is valid.
+        state (dict): Training state saved by CheckpointManager.save_state, None if no candidate is valid.
+    """
+    for path in paths:
+        try:
+            state = torch.load(path, map_location="cpu", weights_only=False)
+        except (OSError, EOFError, RuntimeError, pickle.UnpicklingError) as e:
+            # missing, truncated or corrupt file, anything else is a bug and propagates
+            print(f"Skipping unreadable state {path}: {e!r}")
+            continue
+        if isinstance(state, dict) and state.get("format") == STATE_FORMAT:
+            return path, state
+        print(f"Skipping {path}: not a training state")
+    return None, None
+
+
+def load_checkpoint(path, device=torch.device("cpu"), with_preprocess=False):
+    """
+    Load a model saved by CheckpointManager, or a whole pickled model saved by older train.py runs.
+
+    Args:
+        path (str): Checkpoint path.
+        device (torch.device, optional): Device to map tensors to. Defaults to cpu.
+        with_preprocess (bool, optional): Also return the stored preprocessing. Defaults to False.
+
+    Returns:
+        model (nn.Module): Model with the saved weights(float32).
+        preprocess (dict): resize, mean and std the model was trained with, None if not stored.
+            Only with `with_preprocess`.
+    """
+    checkpoint = torch.load(path, map_location=device, weights_only=False)
+    if not (isinstance(checkpoint, dict) and checkpoint.get("format") == CHECKPOINT_FORMAT):
+        return (checkpoint, None) if with_preprocess else checkpoint
+    model = build_model(checkpoint["model"], num_classes=checkpoint["num_classes"])
+    model.load_state_dict(checkpoint["state_dict"])
+    model = model.to(device)
+    return (model, checkpoint.get("preprocess")) if with_preprocess else model
+
+
+class CheckpointManager:
+    """
+    Saves state_dict checkpoints without blocking training.
+    `save` snapshots the weights into CPU memory on the calling thread and serializes them on a
+    background thread. Every file is written to a temporary name and renamed atomically, so a crash
+    never leaves a truncated checkpoint. When several names are due in one call(e.g. best accuracy and
+    best f1 in the same epoch) the file is written once and the other names are hard links to it.
+    With `top_k`, the k best epochs by `top_k_metric` are also kept as {prefix}_epoch{N}.pt.
+
+    Args:
+        save_dir (str): Directory checkpoints are written to.
+        model_name (str): model.py class name, stored to rebuild the model.
+        num_classes (int): Number of classes, stored to rebuild the model.
+        half (bool, optional): Store floating point weights as float16. Defaults to False.
+        top_k (int, optional): Number of per-epoch checkpoints kept. Defaults to 0(disabled).
+        top_k_metric (str, optional): Metric that ranks epochs(higher is better). Defaults to "f1".
+        prefix (str, optional): File name prefix of top-k checkpoints. Defaults to "model".
+        preprocess (dict, optional): resize, mean and std of training, stored so export.py and
+            quantize.py normalize like training did. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        save_dir,
+        model_name,
+        num_classes,
+        half=False,
+        top_k=0,
+        top_k_metric="f1",
+        prefix="model",
+        preprocess=None,
+    ):
+        self.save_dir = save_dir
+        self.model_name = model_name
+        self.num_classes = num_classes
+        self.preprocess = preprocess
+        self.half = half
+        self.top_k = top_k
+        self.top_k_metric = top_k_metric
+        self.prefix = prefix
+        self.top = []  # (metric, epoch, file name)
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+
+    def save(self, model, names, epoch, metrics):
+        """
+        Save a checkpoint under every name, and as a top-k epoch checkpoint when it ranks.
+
+        Args:
+            model (nn.Module): Model to save.
+            names (sequence): File names in save_dir (e.g. ["multitask.pt", "multitaskf1.pt"]).
+            epoch (int): Epoch.
+            metrics (dict): Validation metrics stored with the weights.
+        """
+        names = list(names)
+        removed = []
+        if self.top_k and self.top_k_metric in metrics:
+            value = metrics[self.top_k_metric]
+            if len(self.top) < self.top_k or value > self.top[-1][0]:
+                name = f"{self.prefix}_epoch{epoch:03d}.pt"
+                names.append(name)
+                self.top = sorted(self.top + [(value, epoch, name)], key=lambda item: -item[0])
+                removed = [name for _, _, name in self.top[self.top_k :]]
+                self.top = self.top[: self.top_k]
+        if not names:
+            return
+
+        checkpoint = dict(
+            format=CHECKPOINT_FORMAT,
+            model=self.model_name,
+            num_classes=self.num_classes,
+            preprocess=self.preprocess,
+            epoch=epoch,
+            metrics={key: float(value) for key, value in metrics.items()},
+            state_dict=snapshot(model, half=self.half),
+        )
+        self.pending.append(self.writer.submit(self._write, checkpoint, names, removed))
+        self._raise_errors()
+
+    def save_state(self, state, name=STATE_FILE):
+        """
+        Save a full training state(model, optimizer, scheduler, position, RNG...) in the background.
+        Tensors are copied to CPU before returning, the previous state stays intact until the new one
+        is completely written.
+
+        Args:
+            state (dict): Training state, see train.py.
+            name (str, optional): File name in save_dir. Defaults to STATE_FILE.
+        """
+        state = dict(to_cpu(state), format=STATE_FORMAT, top=list(self.top))
+        self.pending.append(self.writer.submit(self._write, state, [name], []))
+        self._raise_errors()
+
+    def load_state(self, state):
+        """Restore the top-k ranking from a training state."""
+        self.top = [tuple(item) for item in state.get("top", [])]
+
+    def _write(self, checkpoint, names, removed):
+        first = os.path.join(self.save_dir, names[0])
+        tmp_path = first + ".tmp"
+        torch.save(checkpoint, tmp_path)
+        for name in names[1:]:
+            path = os.path.join(self.save_dir, name)
+            link_tmp = path + ".tmp"
+            if os.path.exists(link_tmp):
+                os.remove(link_tmp)
+            try:
+                os.link(tmp_path, link_tmp)
+            except OSError:
+                shutil.copyfile(tmp_path, link_tmp)
+            os.replace(link_tmp, path)
+        os.replace(tmp_path, first)
+        for name in removed:
+            path = os.path.join(self.save_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _raise_errors(self):
+        done = [future for future in self.pending if future.done()]
+        self.pending = [future for future in self.pending if not future.done()]
+        for future in done:
+            future.result()
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        for future in self.pending:
+            future.result()
+        self.pending = []
+
+    def close(self):
+        self.wait()
+        self.writer.shutdown()
@@ -0,0 +1,130 @@
+"""
+Single entry point for the project scripts.
+
+    python cli.py train --epochs 10
+    python cli.py infer --model_name multitask.pt
+    python cli.py ensemble --pred_dir ./voting
+    python cli.py stats --report split
+    python cli.py export --format onnx
+    python cli.py sweep --num_trials 27
+    python cli.py --import_report true
+
+Every subcommand runs the `__main__` block of its script with the remaining arguments, so options and
+--help are the script's own and only that script's dependencies are imported. This module itself imports
+nothing beyond the standard library.
+"""
+
+# System Libs.
+import argparse
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    "train": ("train.py", "train a model"),
+    "infer": ("inference.py", "predict the eval set"),
+    "ensemble": ("ensemble.py", "vote over prediction csv files"),
+    "stats": ("stats.py", "channel mean/std and split label distribution"),
+    "export": ("export.py", "export a checkpoint to TorchScript / ONNX"),
+    "sweep": ("sweep.py", "offline hyperparameter sweep with successive halving"),
+}
+HEAVY_MODULES = (
+    "torch",
+    "torchvision",
+    "pandas",
+    "matplotlib",
+    "seaborn",
+    "sklearn",
+    "wandb",
+    "PIL",
+    "numpy",
+)
+
+
+def run(command, argv):
+    """
+    Run a subcommand's script as __main__ with argv.
+
+    Args:
+        command (str): Subcommand name.
+        argv (sequence): Arguments for the script.
+    """
+    script = os.path.join(ROOT, COMMANDS[command][0])
+    sys.argv = [script] + list(argv)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    runpy.run_path(script, run_name="__main__")
+
+
+def startup(argv, repeat=3):
+    """
+    Fastest of `repeat` fresh interpreters running argv with -X importtime.
+
+    Returns:
+        seconds (float): Wall time.
+        heavy (list): HEAVY_MODULES the run imported.
+    """
+    best, imported = float("inf"), set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv], cwd=ROOT, capture_output=True, text=True
+        )
+        best = min(best, time.perf_counter() - start)
+        for line in proc.stderr.splitlines():
+            if line.startswith("import time:") and line.count("|") == 2:
+                imported.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return best, [name for name in HEAVY_MODULES if name in imported]
+
+
+def import_report(commands=tuple(COMMANDS), repeat=3):
+    """
+    Startup time of `cli.py {command} --help` per subcommand against importing every script up front.
+
+    Returns:
+        report (dict): Seconds and heavy imports per subcommand, and the eager baseline.
+    """
+    modules = ", ".join(os.path.splitext(COMMANDS[command][0])[0] for command in COMMANDS)
+    eager, eager_heavy = startup(["-c", f"import {modules}"], repeat)
+    report = dict(eager=dict(seconds=eager, heavy=eager_heavy), commands={})
+    for command in commands:
+        seconds, heavy = startup([os.path.join(ROOT, "cli.py"), command, "--help"], repeat)
+        report["commands"][command] = dict(seconds=seconds, saved=eager - seconds, heavy=heavy)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        run(sys.argv[1], sys.argv[2:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(
+        description="\n".join(f"  {name:<9}{help}" for name, (_, help) in COMMANDS.items()),
+        usage="python cli.py {%s} [args]" % ",".join(COMMANDS),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--import_report", type=bool, default=False, help="measure startup time of every subcommand"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (default: 3)")
+    parser.add_argument("--output", type=str, default="", help="save the import report as json")
+    args = parser.parse_args()
+    if not args.import_report:
+        parser.print_help()
+        sys.exit()
+
+    report = import_report(repeat=args.repeat)
+    eager = report["eager"]
+    print(f"{'import all scripts':<20}{eager['seconds']:>8.2f}s  {', '.join(eager['heavy'])}")
+    for command, result in report["commands"].items():
+        print(
+            f"{'cli.py ' + command:<20}{result['seconds']:>8.2f}s  saved {result['saved']:>5.2f}s  "
+            f"{', '.join(result['heavy'])}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
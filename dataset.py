@@ -1,104 +1,17 @@
-# System Libs.
-import random
-from pathlib import Path
-
 # Other Libs
 import numpy as np
-import pandas as pd
 
-from torch.utils.data import Dataset
+import torch
+from torch.utils.data import Dataset, Sampler
 from PIL import Image
 from tqdm import tqdm
 
+from shard import ShardReader
+from info import TrainInfo  # re-exported, TrainInfo needs no torch
+from stats import compute_statistics
 from transform import BaseTransform
 
 
-class TrainInfo:
-    """ 
-    Class for manage/manipulate the dataframe for PyTorch Dataset construction.
-    The dataframe should contain 1) Paths about the image files, 2) Labels for matching images.
-    
-    Args:
-        file_dir (str or pathlib.Path, optional):  Dataframe csv file path. Defaults to None.
-        data_dir (str or pathlib.Path, optional):  Parent path for image files. Defaults to "/opt/ml/input/data/train/images"
-        new_dataset (bool, optional):  Whether the data_dir needs to be updated. Defaults to False.
-    """
-
-    def __init__(
-        self, file_dir=None, data_dir="/opt/ml/input/data/train/images", new_dataset=False,
-    ):
-        self.data = pd.read_csv(file_dir) if file_dir else pd.read_csv("metadata/processed_train.csv")
-        self.data_dir = Path(data_dir)
-
-        if new_dataset == False:
-            self.update_data_dir()
-
-    def update_data_dir(self):
-        """Update path data for image files.
-        """
-        paths = self.data["FullPath"]
-        paths_pre = paths.copy()
-        paths_pre.loc[:] = str(self.data_dir)
-        paths_post = paths.str.split("/images").str[1]
-        self.data["FullPath"] = paths_pre.str.cat(paths_post)
-
-    def split_dataset(self, val_size=0.2, crit_col="path", shuffle=True, random_state=32):
-        """
-        Split the data info to train info and validation info.
-
-        Args:
-            val_size (float, optional): Ratio for validation set. Defaults to 0.2.
-            crit_col (str, optional): Split by column. Defaults to "path".
-            shuffle (bool, optional): Shuffle. Defaults to True.
-            random_state (int, optional): Random seed number. Defaults to 32.
-
-        Returns:
-            train_df (pd.DataFrame): Train set info
-            valid_df (pd.DataFrame): Validation set info
-            split_result (pd.DataFrame): Split result(Distribution info for each feature)
-        """
-        if random_state:
-            random.seed(random_state)
-        _idxs = set(self.data[crit_col].unique())
-        _size = len(_idxs)
-        _size_valid = int(_size * val_size)
-
-        valid_idxs = set(random.sample(_idxs, _size_valid))
-        valid_df = self.data.loc[self.data[crit_col].isin(valid_idxs)]
-
-        train_idxs = _idxs - valid_idxs
-        train_df = self.data.loc[self.data[crit_col].isin(train_idxs)]
-        # age offset
-        train_df = train_df.query("(age <= 25) | (age >=30 & age <= 58) | (age >= 60)")
-
-        split_result = dict(origin=self.data, train=train_df, valid=valid_df)
-        split_result = self._split_result(split_result)
-
-        return train_df, valid_df, split_result
-
-    def _split_result(self, df_dict, col_list=["Mask", "Age", "Gender"]):
-        dist_list = []
-        for name, df in df_dict.items():
-            dist_df_list = []
-            for col in col_list:
-                # Dist. info
-                dist_count = pd.DataFrame(df[col].value_counts())
-                dist_count.columns = ["Count"]
-                dist_ratio = pd.DataFrame(df[col].value_counts(True))
-                dist_ratio.columns = ["Ratio"]
-
-                # Construct & append dataframe
-                _dist_df = pd.concat([dist_count, dist_ratio], axis=1)
-                _dist_df.index = pd.MultiIndex.from_product([[col], _dist_df.index])
-                dist_df_list.append(_dist_df)
-            dist_df = pd.concat(dist_df_list, axis=0)
-            dist_df.columns = pd.MultiIndex.from_product([[name], dist_df.columns])
-            dist_list.append(dist_df)
-        dist_info = pd.concat(dist_list, axis=1)
-
-        return dist_info
-
-
 class MaskBaseDataset(Dataset):
     """
     Generate Dataset from Info dataframe.
@@ -109,14 +22,16 @@ class MaskBaseDataset(Dataset):
         std (sequence, optional): Std info for normalize.
         path_col (str, optional): Path info for reading image files.
         label_col (str, optional): Label info.
+        cache (cache.ImageCache, optional): Pre-decoded image cache. Defaults to None.
     """
 
-    def __init__(self, data_info, mean=None, std=None, path_col="FullPath", label_col="Class"):
+    def __init__(self, data_info, mean=None, std=None, path_col="FullPath", label_col="Class", cache=None):
         """Initialize
         """
         self.data_info = data_info
         self.path_col = path_col
         self.path_label = label_col
+        self.cache = cache
 
         self.mean = mean
         self.std = std
@@ -135,6 +50,7 @@ class MaskBaseDataset(Dataset):
         self.img_paths = list(self.data_info[self.path_col])
         self.labels = list(self.data_info[self.path_label])
         self.num_classes = len(set(self.labels))
+        self.cache_idxs = self.cache.indices(self.img_paths) if self.cache is not None else None
 
     def calc_statistics(self):
         """Calculate and update mean & std info.
@@ -142,15 +58,7 @@ class MaskBaseDataset(Dataset):
         has_statistics = self.mean is not None and self.std is not None
         if not has_statistics:
             print("Calculating statistics... This might take a while")
-            sums = []
-            squared = []
-            for img_path in tqdm(self.img_paths):
-                image = np.array(Image.open(img_path)).astype(np.int32)
-                sums.append(image.mean(axis=(0, 1)))
-                squared.append((image ** 2).mean(axis=(0, 1)))
-
-            self.mean = np.mean(sums, axis=0) / 255
-            self.std = (np.mean(squared, axis=0) - self.mean ** 2) ** 0.5 / 255
+            self.mean, self.std = compute_statistics(self.img_paths)
 
     def set_transform(self, transform):
         """
@@ -199,6 +107,8 @@ class MaskBaseDataset(Dataset):
         Returns:
             image (Image): Image
         """
+        if self.cache is not None:
+            return self.cache.read(self.cache_idxs[index])
         img_path = self.img_paths[index]
         return Image.open(img_path)
 
@@ -251,6 +161,120 @@ class MaskBaseDataset(Dataset):
         return _img
 
 
+class ShardDataset(MaskBaseDataset):
+    """
+    Generate Dataset from a shard index(see shard.py) and read images from the shards.
+
+    Args:
+        data_info (pd.DataFrame): Shard index rows for dataset construction.
+        shard_dir (str or pathlib.Path): Directory that contains the shards.
+        mean (sequence, optional): Mean info for normalize.
+        std (sequence, optional): Std info for normalize.
+        path_col (str, optional): Path info(only used to identify images).
+        label_col (str, optional): Label info.
+        cache (cache.ImageCache, optional): Pre-decoded image cache. Defaults to None.
+    """
+
+    def __init__(
+        self, data_info, shard_dir, mean=None, std=None, path_col="FullPath", label_col="Class", cache=None
+    ):
+        """Initialize
+        """
+        self.reader = ShardReader(shard_dir)
+        self.locations = data_info[["Shard", "Offset", "Length"]].to_numpy()
+        self.shard_ids = self.locations[:, 0]
+        super().__init__(data_info, mean=mean, std=std, path_col=path_col, label_col=label_col, cache=cache)
+
+    def calc_statistics(self):
+        """Calculate and update mean & std info.
+        """
+        has_statistics = self.mean is not None and self.std is not None
+        assert has_statistics, "ShardDataset 은 mean, std 를 직접 넣어주세요"
+
+    def read_image(self, index):
+        """
+        Read and return the image corresponding to the index from the shards.
+
+        Args:
+            index (int): Index
+
+        Returns:
+            image (Image): Image
+        """
+        if self.cache is not None:
+            return super().read_image(index)
+        return self.reader.read(*self.locations[index])
+
+
+class ShardSampler(Sampler):
+    """
+    Shard-level shuffling sampler.
+    Every epoch the order of shards is shuffled and samples are shuffled within each shard, so reads
+    stay sequential-ish inside one shard at a time.
+
+    Args:
+        shard_ids (sequence): Shard number of each sample.
+        shuffle (bool, optional): Shuffle shards and samples. Defaults to True.
+    """
+
+    def __init__(self, shard_ids, shuffle=True):
+        self.shard_ids = np.asarray(shard_ids)
+        self.shuffle = shuffle
+        self.groups = [np.flatnonzero(self.shard_ids == shard) for shard in np.unique(self.shard_ids)]
+
+    def __iter__(self):
+        if not self.shuffle:
+            yield from np.concatenate(self.groups).tolist()
+            return
+        generator = torch.Generator()
+        generator.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+        for group_idx in torch.randperm(len(self.groups), generator=generator).tolist():
+            group = self.groups[group_idx]
+            yield from group[torch.randperm(len(group), generator=generator).numpy()].tolist()
+
+    def __len__(self):
+        return len(self.shard_ids)
+
+
+class ResumableSampler(Sampler):
+    """
+    Makes a sampler's order a function of (seed, epoch) and lets an epoch start part way through.
+    The wrapped sampler is drawn under a forked torch RNG seeded with seed + epoch, so the batch order
+    does not depend on how much of the global RNG training consumed, and a resumed run can skip the
+    samples it already trained on.
+
+    Args:
+        sampler (Sampler): Sampler to wrap (RandomSampler, ShardSampler, DistributedSampler).
+        seed (int, optional): Base seed. Defaults to 0.
+    """
+
+    def __init__(self, sampler, seed=0):
+        self.sampler = sampler
+        self.seed = seed
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        """
+        Args:
+            epoch (int): Epoch, also forwarded to samplers with `set_epoch`.
+            start (int, optional): Number of samples of the epoch to skip. Defaults to 0.
+        """
+        self.epoch = epoch
+        self.start = start
+        if hasattr(self.sampler, "set_epoch"):
+            self.sampler.set_epoch(epoch)
+
+    def __iter__(self):
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(self.seed + self.epoch)
+            indices = list(self.sampler)
+        yield from indices[self.start :]
+
+    def __len__(self):
+        return max(len(self.sampler) - self.start, 0)
+
+
 class TestDataset(Dataset):
     """
     Dataset for test data(eval).
@@ -260,18 +284,28 @@ class TestDataset(Dataset):
         resize (tuple): Size for resize.
         mean (tuple, optional): Mean value. Defaults to (0.548, 0.504, 0.479).
         std (tuple, optional): Std value. Defaults to (0.237, 0.247, 0.246).
+        cache (cache.ImageCache, optional): Pre-decoded image cache. Defaults to None.
     """
 
-    def __init__(self, img_paths, resize, mean=(0.548, 0.504, 0.479), std=(0.237, 0.247, 0.246)):
+    def __init__(self, img_paths, resize, mean=(0.548, 0.504, 0.479), std=(0.237, 0.247, 0.246), cache=None):
         """Initialize.
         """
         self.img_paths = img_paths
         self.transform = BaseTransform(resize=resize, mean=mean, std=std)
+        self.cache = cache
+        self.cache_idxs = cache.indices(img_paths) if cache is not None else None
+
+    def read_image(self, index):
+        """Read image.
+        """
+        if self.cache is not None:
+            return self.cache.read(self.cache_idxs[index])
+        return Image.open(self.img_paths[index])
 
     def __getitem__(self, index):
         """Get item.
         """
-        image = Image.open(self.img_paths[index])
+        image = self.read_image(index)
 
         if self.transform:
             image = self.transform(image)
@@ -281,3 +315,28 @@ class TestDataset(Dataset):
         """Length of dataset.
         """
         return len(self.img_paths)
+
+
+class TestShardDataset(TestDataset):
+    """
+    Dataset for test data(eval) packed into shards(see shard.py).
+
+    Args:
+        info (pd.DataFrame): Shard index of the eval data.
+        shard_dir (str or pathlib.Path): Directory that contains the shards.
+        resize (tuple): Size for resize.
+        mean (tuple, optional): Mean value. Defaults to (0.548, 0.504, 0.479).
+        std (tuple, optional): Std value. Defaults to (0.237, 0.247, 0.246).
+    """
+
+    def __init__(self, info, shard_dir, resize, mean=(0.548, 0.504, 0.479), std=(0.237, 0.247, 0.246)):
+        """Initialize.
+        """
+        super().__init__(list(info["ImageID"]), resize, mean=mean, std=std)
+        self.reader = ShardReader(shard_dir)
+        self.locations = info[["Shard", "Offset", "Length"]].to_numpy()
+
+    def read_image(self, index):
+        """Read image from the shards.
+        """
+        return self.reader.read(*self.locations[index])
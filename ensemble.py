@@ -1,74 +1,44 @@
 # System Libs.
+import argparse
 import os
-from pathlib import Path
+import time
 
 # Other Libs
-import pandas as pd
-
-
-def ensemble_preds(pred_folder_path, save_path, weights=None, return_result=False):
-    """
-    Save and get voting result from predictions.
-
-    Args:
-        read_paths (list): Prediction csv file list.
-        save_path (str or pathlib.Path): Voting result save path.
-        weights (sequence): Weight for each prediction. Defaults to None.
-        return_result (bool): Wheter return voting result.
-
-    Returns:
-        ensemble_result(pd.DataFrame): Voting result.
-    """
-
-    def _voting(voting):
-        """
-        Get voting result with voting weights.
-
-        Args:
-            voting (pd.Series): Vote for each prediction.
-
-        Returns:
-            result (int): Voting result.
-        """
-        result_dict = {pred_value: 0 for pred_value in voting.unique()}
-        for vote, weight in zip(voting, weights):
-            result_dict[vote] += weight
-        result = max(result_dict, key=result_dict.get)
-        return result
-
-
-    pred_folder_path = Path(pred_folder_path)
-    pred_list = os.listdir(pred_folder_path)
-    pred_list = [pred_folder_path.joinpath(f) for f in pred_list if ((f[-4:]=='.csv') & (f[0] != '_'))]
-    weights = weights if weights else [1] * len(pred_list)
-
-    preds = []
-    for f in pred_list:
-        df = (pd.read_csv(f, index_col=0)).astype(int)
-        preds.append(df)
-    preds = pd.concat(preds, axis=1)
-
-    ensemble_dict = dict()
-    for idx, row in preds.iterrows():
-        ensemble_dict[idx] = _voting(row)
-    ensemble_result = (pd.DataFrame(pd.Series(ensemble_dict))).reset_index()
-    ensemble_result.columns = [preds.index.name, preds.columns[0]]
-
-    ensemble_result.to_csv(save_path, index=False)
-
-    if return_result:
-        return ensemble_result
-
+from voting.ensemble import ensemble_preds, list_preds
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    prser.add_argument(
-        "
+    parser.add_argument(
+        "--pred_dir", type=str, default="./voting", help="folder of prediction csv files (default: ./voting)"
     )
+    parser.add_argument(
+        "--save_path",
+        type=str,
+        default="",
+        help="voting result path (default: {pred_dir}/ensemble_result.csv)",
+    )
+    parser.add_argument(
+        "--weights",
+        nargs="+",
+        type=float,
+        default=None,
+        help="weight for each prediction csv, in file name order (default: equal weights)",
+    )
+    parser.add_argument("--num_workers", type=int, default=8, help="csv reader threads (default: 8)")
+    parser.add_argument(
+        "--soft",
+        type=bool,
+        default=False,
+        help="soft voting from the .logits.npy / .probs.npy saved by inference.py --save_scores",
+    )
+    args = parser.parse_args()
 
+    save_path = args.save_path or os.path.join(args.pred_dir, "ensemble_result.csv")
+    for idx, f in enumerate(list_preds(args.pred_dir, exclude=save_path)):
+        print(f"{idx:3d} {f.name}")
 
-    helper = settings.SettingsHelper(
-        args=args, device=torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    start = time.perf_counter()
+    ensemble_preds(
+        args.pred_dir, save_path, weights=args.weights, num_workers=args.num_workers, soft=args.soft
     )
-
-    ensemble_preds(helper=helper)
+    print(f"Saved voting result to {save_path} ({time.perf_counter() - start:.2f}s)")
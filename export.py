@@ -0,0 +1,251 @@
+# System Libs.
+import argparse
+import json
+import os
+import time
+import zipfile
+
+# Other Libs
+import numpy as np
+import torch
+import torch.nn as nn
+
+from checkpoint import is_quantized, load_checkpoint, unwrap
+from transform import BatchNormalize
+
+ARTIFACT_FORMATS = {".ts": "torchscript", ".onnx": "onnx"}
+META_FILE = "meta.json"
+# inference.py's constants, used for checkpoints that do not store their training preprocessing
+DEFAULT_PREPROCESS = dict(resize=(512, 384), mean=(0.548, 0.504, 0.479), std=(0.237, 0.247, 0.246))
+
+
+class InferenceModule(nn.Module):
+    """
+    Self-contained inference graph.
+    Takes a resized uint8 image batch (N, 3, H, W), normalizes it with the embedded constants and
+    returns 18-class scores, so `argmax` gives the answer for every model.py model. Multi-head models
+    (model.MultiTaskResNet18) return the summed per-head log-probabilities, whose argmax equals `predict`.
+
+    Args:
+        model (nn.Module): Trained model, without the DataParallel wrapper.
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+        class_scores (callable, optional): Model outputs -> 18-class scores.
+            Defaults to `model.class_scores` if the model has one, pass it explicitly for converted
+            (e.g. quantized) models that lost their methods.
+    """
+
+    def __init__(self, model, mean, std, class_scores=None):
+        super().__init__()
+        self.normalize = BatchNormalize(mean=mean, std=std)
+        self.model = model
+        self.class_scores = class_scores or getattr(model, "class_scores", None)
+
+    def forward(self, images):
+        outputs = self.model(self.normalize(images))
+        if self.class_scores is None:
+            return outputs
+        return self.class_scores(outputs)
+
+
+def resolve_preprocess(preprocess, resize=None, mean=None, std=None):
+    """
+    resize, mean and std of an artifact: the given values, else the checkpoint's, else DEFAULT_PREPROCESS.
+
+    Args:
+        preprocess (dict): Preprocessing stored in the checkpoint(checkpoint.load_checkpoint), or None.
+        resize, mean, std (sequence, optional): Values overriding the checkpoint. Defaults to None.
+
+    Returns:
+        preprocess (dict): resize, mean and std.
+    """
+    if preprocess is None:
+        print("Checkpoint has no training preprocessing, using the inference defaults")
+    result = dict(DEFAULT_PREPROCESS, **(preprocess or {}))
+    for key, value in dict(resize=resize, mean=mean, std=std).items():
+        if value is not None:
+            result[key] = value
+    return {key: list(value) for key, value in result.items()}
+
+
+def export_model(model, out_path, resize, mean, std):
+    """
+    Export a trained model as a TorchScript(.ts) or ONNX(.onnx) artifact with a dynamic batch axis.
+    resize, mean and std are stored with the artifact, so inference needs nothing from the training code.
+
+    Args:
+        model (nn.Module): Trained model (wrappers are stripped) or an InferenceModule.
+        out_path (str): Artifact path, the extension chooses the format.
+        resize (sequence): (height, width) the model was trained on.
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+
+    Returns:
+        meta (dict): Metadata stored with the artifact.
+    """
+    fmt = ARTIFACT_FORMATS[os.path.splitext(out_path)[1]]
+    if isinstance(model, InferenceModule):
+        module = model.cpu().eval()
+    else:
+        module = InferenceModule(unwrap(model).cpu().float(), mean, std).eval()
+    example = torch.zeros((2, 3, *resize), dtype=torch.uint8)
+    meta = dict(
+        resize=list(resize), mean=list(mean), std=list(std), format=fmt, quantized=is_quantized(module)
+    )
+
+    if fmt == "torchscript":
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(module, example))
+        torch.jit.save(traced, out_path, _extra_files={META_FILE: json.dumps(meta)})
+    else:
+        import onnx
+
+        torch.onnx.export(
+            module,
+            example,
+            out_path,
+            input_names=["images"],
+            output_names=["scores"],
+            dynamic_axes={"images": {0: "batch"}, "scores": {0: "batch"}},
+        )
+        graph = onnx.load(out_path)
+        onnx.helper.set_model_props(graph, {META_FILE: json.dumps(meta)})
+        onnx.save(graph, out_path)
+    return meta
+
+
+class OnnxModule:
+    """Calls an onnxruntime session like a torch module (torch uint8 batch in, torch scores out)."""
+
+    def __init__(self, path, device):
+        import onnxruntime
+
+        providers = ["CUDAExecutionProvider"] if device.type == "cuda" else []
+        self.session = onnxruntime.InferenceSession(path, providers=providers + ["CPUExecutionProvider"])
+        self.device = device
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.meta = json.loads(meta[META_FILE])
+
+    def __call__(self, images):
+        (scores,) = self.session.run(None, {"images": images.cpu().numpy()})
+        return torch.from_numpy(scores).to(self.device)
+
+    def eval(self):
+        return self
+
+
+def is_artifact(model_name):
+    return os.path.splitext(model_name)[1] in ARTIFACT_FORMATS
+
+
+def load_artifact(path, device):
+    """
+    Load an exported artifact.
+
+    Args:
+        path (str): Artifact path (.ts or .onnx).
+        device (torch.device): Device to run on.
+
+    Returns:
+        module (callable): uint8 image batch -> 18-class scores.
+        meta (dict): resize, mean, std and format of the artifact, and the device it runs on
+            (quantized TorchScript artifacts always run on CPU).
+    """
+    if ARTIFACT_FORMATS[os.path.splitext(path)[1]] == "onnx":
+        module = OnnxModule(path, device)
+        return module, dict(module.meta, device=str(device))
+
+    # the metadata is read from the archive first, so quantized artifacts are never mapped to the GPU
+    with zipfile.ZipFile(path) as archive:
+        meta_path = next(name for name in archive.namelist() if name.endswith(f"/extra/{META_FILE}"))
+        meta = json.loads(archive.read(meta_path))
+    if meta.get("quantized") and device.type != "cpu":
+        print(f"{path} has quantized(int8) ops that only run on CPU, loading it on CPU")
+        device = torch.device("cpu")
+    module = torch.jit.load(path, map_location=device)
+    return module.eval(), dict(meta, device=str(device))
+
+
+def measure_latency(load, images, steps=10):
+    """Cold start(load + first batch) and median per-batch latency in milliseconds."""
+    start = time.perf_counter()
+    predict = load()
+    with torch.no_grad():
+        predict(images)
+        cold_start = time.perf_counter() - start
+        times = []
+        for _ in range(steps):
+            start = time.perf_counter()
+            predict(images)
+            times.append(time.perf_counter() - start)
+    return dict(cold_start_ms=cold_start * 1000, batch_ms=float(np.median(times)) * 1000)
+
+
+def compare_latency(checkpoint_path, artifact_path, batch_size=64, steps=10, device=torch.device("cpu")):
+    """
+    Compare the checkpoint path(load + normalize + model) against the exported artifact.
+
+    Returns:
+        result (dict): Cold start / per-batch latency of both paths and the max score difference.
+    """
+    _, meta = load_artifact(artifact_path, device)
+    device = torch.device(meta["device"])
+    images = torch.randint(0, 256, (batch_size, 3, *meta["resize"]), dtype=torch.uint8, device=device)
+
+    def load_model():
+        model = unwrap(load_checkpoint(checkpoint_path, device))
+        return InferenceModule(model, meta["mean"], meta["std"]).to(device).eval()
+
+    result = dict(
+        checkpoint=measure_latency(load_model, images, steps),
+        artifact=measure_latency(lambda: load_artifact(artifact_path, device)[0], images, steps),
+    )
+    with torch.no_grad():
+        diff = load_model()(images) - load_artifact(artifact_path, device)[0](images)
+    result["max_abs_diff"] = diff.abs().max().item()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", type=str, default=os.environ.get("SM_CHANNEL_MODEL", "./model"))
+    parser.add_argument("--name", type=str, default="exp")
+    parser.add_argument("--model_name", type=str, default="best.pt")
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="torchscript",
+        choices=["torchscript", "onnx"],
+        help="(default: torchscript)",
+    )
+    parser.add_argument(
+        "--resize",
+        nargs=2,
+        type=int,
+        default=None,
+        help="resize size for image when you trained (default: from the checkpoint, else (512, 384))",
+    )
+    parser.add_argument("--mean", nargs=3, type=float, default=None, help="(default: from the checkpoint)")
+    parser.add_argument("--std", nargs=3, type=float, default=None, help="(default: from the checkpoint)")
+    parser.add_argument(
+        "--compare", type=bool, default=False, help="compare latency of checkpoint and artifact"
+    )
+    parser.add_argument("--batch_size", type=int, default=64, help="batch size for --compare (default: 64)")
+    args = parser.parse_args()
+
+    model_dir = os.path.join(args.model_dir, args.name)
+    ext = {v: k for k, v in ARTIFACT_FORMATS.items()}[args.format]
+    out_path = os.path.join(model_dir, os.path.splitext(args.model_name)[0] + ext)
+    model, preprocess = load_checkpoint(
+        os.path.join(model_dir, args.model_name), torch.device("cpu"), with_preprocess=True
+    )
+    preprocess = resolve_preprocess(preprocess, args.resize, args.mean, args.std)
+    meta = export_model(model, out_path, preprocess["resize"], preprocess["mean"], preprocess["std"])
+    print(f"Exported {args.model_name} to {out_path}: {meta}")
+
+    if args.compare:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        result = compare_latency(
+            os.path.join(model_dir, args.model_name), out_path, batch_size=args.batch_size, device=device
+        )
+        print(json.dumps(result, indent=4))
@@ -1,19 +1,27 @@
 import argparse
+import multiprocessing
 import os
 from importlib import import_module
 
+import numpy as np
 import pandas as pd
 import torch
 from tqdm import tqdm
 
-from dataset import TestDataset
-
-from tqdm import tqdm
+from cache import ImageCache
+from checkpoint import load_checkpoint
+from dataset import TestDataset, TestShardDataset
+from export import is_artifact, load_artifact
+from model import joint_log_probs
+from shard import INDEX_FILE, SHARD_COLUMNS
+from transform import BatchBaseTransform, BatchTTA
+from voting.ensemble import SCORE_KINDS, scores_path
 
 
 def load_model(model_dir, device, model_name):
     r"""
     Bring your saved model
+    Reads state_dict checkpoints from checkpoint.CheckpointManager and whole pickled models of older runs.
 
     Args:
         model_dir : Saved model path         -> str
@@ -21,28 +29,26 @@ def load_model(model_dir, device, model_name):
         model_name : model's name            -> str
     """
     model_path = os.path.join(model_dir, model_name)
-    model = torch.load(model_path, map_location=device)
+    model = load_checkpoint(model_path, device)
 
     return model
 
 
-@torch.no_grad()
-def inference(data_dir, model_dir, output_dir, new_dataset):
+def get_test_dataset(data_dir, new_dataset):
     r"""
+    Build eval info and dataset from loose images, image cache or shards.
 
     Args:
         data_dir : evaluate images dir       -> str
-        model_dir : saved model dir          -> str
-        ouput_dir : set final_result dir     -> str
         new_dataset : use new_dataset or not -> boolean
-    Caution:
-        model name is not {mode}f1.pt then u have to change model name
+    Returns:
+        info : eval info(ImageID)            -> pd.DataFrame
+        dataset : eval dataset               -> TestDataset
     """
-    is_cuda = torch.cuda.is_available()
-    device = torch.device("cuda" if is_cuda else "cpu")
-
-    model = load_model(model_dir, device, args.model_name).to(device)
-    model.eval()
+    if args.shard_dir:
+        index = pd.read_csv(os.path.join(args.shard_dir, INDEX_FILE))
+        info = index.drop(columns=SHARD_COLUMNS)
+        return info, TestShardDataset(index, args.shard_dir, args.resize)
 
     if new_dataset:
         img_root = os.path.join(data_dir, "new_imgs")
@@ -52,30 +58,198 @@ def inference(data_dir, model_dir, output_dir, new_dataset):
     info = pd.read_csv(info_path)
 
     img_paths = [os.path.join(img_root, img_id) for img_id in info.ImageID]
-    dataset = TestDataset(img_paths, args.resize)
+    cache = None
+    if args.cache_dir:
+        cache = ImageCache(args.cache_dir, img_paths, args.resize, source=info_path).load_or_build()
+    return info, TestDataset(img_paths, args.resize, cache=cache)
+
+
+class DevicePrefetcher:
+    r"""
+    Iterate a DataLoader while copying the next batch to the device on a side CUDA stream,
+    so host-to-device transfer overlaps the forward pass of the current batch.
+
+    Args:
+        loader : batches of images               -> torch.utils.data.DataLoader
+        device : device the batches are sent to  -> torch.device
+    """
+
+    def __init__(self, loader, device):
+        self.loader = loader
+        self.device = device
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        if self.device.type != "cuda":
+            for images in self.loader:
+                yield images.to(self.device)
+            return
+
+        stream = torch.cuda.Stream()
+        next_images = None
+        for images in self.loader:
+            with torch.cuda.stream(stream):
+                images = images.to(self.device, non_blocking=True)
+            if next_images is not None:
+                yield next_images
+            torch.cuda.current_stream().wait_stream(stream)
+            images.record_stream(torch.cuda.current_stream())
+            next_images = images
+        if next_images is not None:
+            yield next_images
+
+
+def resume_offset(output_path):
+    r"""
+    Number of results already written to an output csv, dropping a partially written last line.
+
+    Args:
+        output_path : output csv path        -> str
+    Returns:
+        offset : number of written rows      -> int
+    """
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, "rb+") as f:
+        content = f.read()
+        end = content.rfind(b"\n") + 1
+        f.truncate(end)
+    return max(content[:end].count(b"\n") - 1, 0)
+
+
+def open_scores(path, num_rows, num_classes, resume=False):
+    r"""
+    float16 (num_rows, num_classes) score array memory-mapped next to the output csv.
+
+    Args:
+        path : score array path(.npy)                 -> str
+        num_rows : number of eval images              -> int
+        num_classes : scores per image                -> int
+        resume : reuse rows written by a previous run -> boolean
+    Returns:
+        scores : writable score array                 -> np.memmap
+    """
+    if resume and os.path.exists(path):
+        scores = np.load(path, mmap_mode="r+")
+        assert scores.shape == (num_rows, num_classes), f"{path} 의 shape 이 {scores.shape} 입니다"
+        return scores
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(num_rows, num_classes))
+
+
+@torch.no_grad()
+def predict_stream(info, dataset, score_batch, output_path, device, resume=False, save_scores=""):
+    r"""
+    Streaming inference engine.
+    Images are decoded by a DataLoader worker pool with prefetch, copied to the device while the previous
+    batch runs, and results are appended to the output csv every `--flush_every` batches, so memory stays
+    flat and an interrupted run continues from the last written row with `--resume`.
+    `--tta` views are built from the decoded batch on the device, so each image is still decoded once.
+    With `save_scores`, class logits or probabilities are also written to a float16 array next to the
+    csv(see voting.ensemble.scores_path) for soft voting without re-running the models.
+
+    Args:
+        info : eval info, one row per image           -> pd.DataFrame
+        dataset : eval dataset(same order)            -> TestDataset
+        score_batch : images -> 18-class scores       -> Callable
+        output_path : output csv path                 -> str
+        device : device to run models on              -> torch.device
+        resume : continue an existing output          -> boolean
+        save_scores : "", "logits" or "probs"         -> str
+    """
+    offset = resume_offset(output_path) if resume else 0
+    if offset:
+        print(f"Resuming from row {offset}")
+        dataset = torch.utils.data.Subset(dataset, range(offset, len(dataset)))
+    loader_kwargs = dict(num_workers=args.num_workers)
+    if args.num_workers > 0:  # torch < 2.0 rejects any prefetch_factor without workers
+        loader_kwargs["prefetch_factor"] = args.prefetch_factor
     loader = torch.utils.data.DataLoader(
         dataset,
         batch_size=args.batch_size,
-        num_workers=2,
         shuffle=False,
-        pin_memory=is_cuda,
+        pin_memory=device.type == "cuda",
         drop_last=False,
+        **loader_kwargs,
     )
+    tta = BatchTTA(args.tta).to(device)
+    # score arrays of another kind(or of an older run without --save_scores) would not match the new csv
+    for kind in SCORE_KINDS:
+        if kind != save_scores and os.path.exists(scores_path(output_path, kind)):
+            os.remove(scores_path(output_path, kind))
+    scores_file = None
 
     print("Calculating inference results..")
-    preds = []
-    with torch.no_grad():
-        for images in tqdm(loader):
-            images = images.to(device)
-            pred = model(images)
-            pred = pred.argmax(dim=-1)
-            preds.extend(pred.cpu().numpy())
-
-    info["ans"] = preds
-    info.to_csv(os.path.join(output_dir, f"{args.name}_output.csv"), index=False)
+    start = end = offset
+    pending = []
+    with open(output_path, "a" if offset else "w", encoding="utf-8", newline="") as f:
+        for idx, images in enumerate(tqdm(DevicePrefetcher(loader, device))):
+            # views of the decoded batch go through one forward pass, their scores are averaged
+            scores = tta.merge(score_batch(tta(images)).float())
+            pending.append(scores.argmax(dim=-1).cpu())
+            if save_scores and scores_file is None:
+                scores_file = open_scores(
+                    scores_path(output_path, save_scores), len(info), scores.shape[-1], resume=offset > 0
+                )
+            if scores_file is not None:
+                if save_scores == "probs":
+                    scores = scores.softmax(dim=-1)
+                scores_file[end : end + len(scores)] = scores.cpu().numpy()
+            end += len(scores)
+            if (idx + 1) % args.flush_every == 0 or idx + 1 == len(loader):
+                # scores reach the disk before their csv rows, so a resumed run never skips missing scores
+                if scores_file is not None:
+                    scores_file.flush()
+                preds = torch.cat(pending).numpy()
+                chunk = info.iloc[start:end].assign(ans=preds)
+                chunk.to_csv(f, header=start == 0, index=False)
+                f.flush()
+                start = end
+                pending = []
     print(f"Inference Done!")
 
 
+@torch.no_grad()
+def inference(data_dir, model_dir, output_dir, new_dataset):
+    r"""
+
+    Args:
+        data_dir : evaluate images dir       -> str
+        model_dir : saved model dir          -> str
+        ouput_dir : set final_result dir     -> str
+        new_dataset : use new_dataset or not -> boolean
+    Caution:
+        model name is not {mode}f1.pt then u have to change model name
+    """
+    is_cuda = torch.cuda.is_available()
+    device = torch.device("cuda" if is_cuda else "cpu")
+
+    if is_artifact(args.model_name):
+        # exported artifact(export.py): uint8 images in, normalization and 18-class scores inside the graph
+        model, meta = load_artifact(os.path.join(model_dir, args.model_name), device)
+        device = torch.device(meta["device"])  # quantized artifacts run on CPU
+        args.resize = meta["resize"]
+        class_scores = None
+    else:
+        model = load_model(model_dir, device, args.model_name).to(device)
+        model.eval()
+        # multi-head models(model.MultiTaskResNet18) give 18-class scores from one forward pass
+        class_scores = getattr(getattr(model, "module", model), "class_scores", None)
+
+    def score_batch(images):
+        outs = model(images)
+        return class_scores(outs) if class_scores else outs
+
+    info, dataset = get_test_dataset(data_dir, new_dataset)
+    if is_artifact(args.model_name):
+        dataset.transform = BatchBaseTransform(args.resize, meta["mean"], meta["std"])
+    output_path = os.path.join(output_dir, f"{args.name}_output.csv")
+    predict_stream(
+        info, dataset, score_batch, output_path, device, resume=args.resume, save_scores=args.save_scores
+    )
+
+
 @torch.no_grad()
 def inference_with_ensemble(data_dir, model_dir, output_dir, new_dataset):
     r"""
@@ -101,46 +275,16 @@ def inference_with_ensemble(data_dir, model_dir, output_dir, new_dataset):
     gender_model.eval()
     mask_model.eval()
 
-    if new_dataset:
-        img_root = os.path.join(data_dir, "new_imgs")
-    else:
-        img_root = os.path.join(data_dir, "images")
-    info_path = os.path.join(data_dir, "info.csv")
-    info = pd.read_csv(info_path)
+    def score_batch(images):
+        # argmax of the joint log-probs equals mask * 6 + gender * 3 + age of the per-model argmax
+        return joint_log_probs(mask_model(images), gender_model(images), age_model(images))
 
-    img_paths = [os.path.join(img_root, img_id) for img_id in info.ImageID]
-    dataset = TestDataset(img_paths, args.resize)
-    loader = torch.utils.data.DataLoader(
-        dataset,
-        batch_size=args.batch_size,
-        num_workers=4,
-        shuffle=False,
-        pin_memory=is_cuda,
-        drop_last=False,
+    info, dataset = get_test_dataset(data_dir, new_dataset)
+    output_path = os.path.join(output_dir, f"{args.name}_output.csv")
+    predict_stream(
+        info, dataset, score_batch, output_path, device, resume=args.resume, save_scores=args.save_scores
     )
 
-    print("Calculating inference results..")
-    preds = []
-    with torch.no_grad():
-        for images in tqdm(loader):
-            images = images.to(device)
-
-            pred = mask_model(images)
-            pred_mask = pred.argmax(dim=-1)
-
-            pred = age_model(images)
-            pred_age = pred.argmax(dim=-1)
-
-            pred = gender_model(images)
-            pred_gender = pred.argmax(dim=-1)
-
-            result = pred_mask * 6 + pred_gender * 3 + pred_age
-            preds.extend(result.cpu().numpy())
-
-    info["ans"] = preds
-    info.to_csv(os.path.join(output_dir, f"{args.name}_output.csv"), index=False)
-    print(f"Inference Done!")
-
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -152,6 +296,15 @@ if __name__ == "__main__":
         default=os.environ.get("SM_CHANNEL_EVAL", "/opt/ml/input/data/eval"),
     )
     parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument(
+        "--cache_dir", type=str, default="", help="pre-decoded image cache directory (default: disabled)"
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default="",
+        help="read eval images from shards packed by shard.py (default: disabled)",
+    )
     parser.add_argument("--model_dir", type=str, default=os.environ.get("SM_CHANNEL_MODEL", "./model"))
     parser.add_argument("--name", type=str, default="exp")
     parser.add_argument(
@@ -159,7 +312,9 @@ if __name__ == "__main__":
         type=str,
         default=os.environ.get("SM_OUTPUT_DATA_DIR", "./output"),
     )
-    parser.add_argument("--model_name", type=str, default="best.pt")
+    parser.add_argument(
+        "--model_name", type=str, default="best.pt", help="checkpoint or artifact from export.py(.ts, .onnx)"
+    )
 
     parser.add_argument(
         "--batch_size",
@@ -169,10 +324,38 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--resize",
-        type=tuple,
+        nargs=2,
+        type=int,
         default=(512, 384),
         help="resize size for image when you trained (default: (512, 384))",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of image decoding workers (default: cpu count)",
+    )
+    parser.add_argument(
+        "--prefetch_factor", type=int, default=2, help="batches prefetched per decoding worker (default: 2)"
+    )
+    parser.add_argument(
+        "--flush_every", type=int, default=1, help="write results to the csv every n batches (default: 1)"
+    )
+    parser.add_argument("--resume", type=bool, default=False, help="continue an interrupted output csv")
+    parser.add_argument(
+        "--tta",
+        type=str,
+        default="none",
+        choices=list(BatchTTA.view_sets),
+        help="test-time augmentation view set, each view multiplies the forward batch (default: none)",
+    )
+    parser.add_argument(
+        "--save_scores",
+        type=str,
+        default="",
+        choices=["", *SCORE_KINDS],
+        help="also save 18-class logits or probs as float16 .npy next to the csv (default: disabled)",
+    )
     parser.add_argument("--mode", type=str, default="all", help="choose all or ensemble")
     args = parser.parse_args()
     print(args)
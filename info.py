@@ -0,0 +1,212 @@
+# System Libs.
+import os
+from pathlib import Path
+
+# Other Libs
+import numpy as np
+import pandas as pd
+
+from stats import load_or_compute_statistics
+
+
+class TrainInfo:
+    """
+    Class for manage/manipulate the dataframe for PyTorch Dataset construction.
+    The dataframe should contain 1) Paths about the image files, 2) Labels for matching images.
+    The csv is converted once to a compact columnar form(categorical / downcast integer columns, image
+    paths as prefix + relative path table) cached next to it as `<name>.info.npz`, which later runs load
+    in milliseconds.
+
+    Args:
+        file_dir (str or pathlib.Path, optional):  Dataframe csv file path. Defaults to None.
+        data_dir (str or pathlib.Path, optional):  Parent path for image files. Defaults to "/opt/ml/input/data/train/images"
+        new_dataset (bool, optional):  Whether the data_dir needs to be updated. Defaults to False.
+    """
+
+    cache_version = 1
+
+    def __init__(
+        self, file_dir=None, data_dir="/opt/ml/input/data/train/images", new_dataset=False,
+    ):
+        self.file_dir = file_dir if file_dir else "metadata/processed_train.csv"
+        self.data_dir = Path(data_dir)
+        self.data, (self.path_prefixes, self.prefix_codes, self.rel_paths) = self.load_compact(self.file_dir)
+        self.data["FullPath"] = self._join_paths(self.path_prefixes)
+
+        if new_dataset == False:
+            self.update_data_dir()
+
+    def update_data_dir(self):
+        """Update path data for image files.
+        Paths under an `.../images` prefix are moved under data_dir.
+        """
+        prefixes = [
+            str(self.data_dir) if prefix.endswith("/images") else prefix for prefix in self.path_prefixes
+        ]
+        self.data["FullPath"] = self._join_paths(prefixes)
+
+    def _join_paths(self, prefixes):
+        paths = np.char.add(np.asarray(prefixes, dtype=str)[self.prefix_codes], self.rel_paths)
+        return pd.Series(paths.tolist(), index=self.data.index)
+
+    @classmethod
+    def load_compact(cls, file_dir):
+        """
+        Load the compact form of a metadata csv, (re)building its npz cache when the csv changed.
+
+        Args:
+            file_dir (str or pathlib.Path): Dataframe csv file path.
+
+        Returns:
+            data (pd.DataFrame): Metadata without the FullPath column.
+            paths (tuple): Path prefixes, prefix code of each row and relative path of each row.
+        """
+        file_dir = Path(file_dir)
+        cache_file = file_dir.with_suffix(".info.npz")
+        stat = file_dir.stat()
+        source = np.array([cls.cache_version, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        if cache_file.exists():
+            with np.load(cache_file, allow_pickle=False) as arrays:
+                if np.array_equal(arrays["__source__"], source):
+                    return cls._from_arrays(arrays)
+
+        arrays = cls._to_arrays(pd.read_csv(file_dir))
+        arrays["__source__"] = source
+        tmp_file = cache_file.with_suffix(".tmp.npz")
+        np.savez(tmp_file, **arrays)
+        os.replace(tmp_file, cache_file)
+        return cls._from_arrays(arrays)
+
+    @staticmethod
+    def _to_arrays(data):
+        arrays = dict(__columns__=np.array([col for col in data.columns if col != "FullPath"], dtype=str))
+        for col in arrays["__columns__"]:
+            values = data[col]
+            if pd.api.types.is_numeric_dtype(values):
+                if values.notna().all() and (values == values.round()).all():
+                    values = pd.to_numeric(values.astype(np.int64), downcast="integer")
+                arrays[f"{col}::values"] = values.to_numpy()
+            else:
+                values = values.astype("category")
+                arrays[f"{col}::codes"] = values.cat.codes.to_numpy()
+                arrays[f"{col}::categories"] = values.cat.categories.to_numpy().astype(str)
+
+        # Image paths: `<prefix>/images` + `/<person>/<file>`, or `<dir>` + `/<file>` for other layouts.
+        paths = data["FullPath"].astype(str)
+        parts = paths.str.partition("/images/")
+        has_images = (parts[1] != "").to_numpy()
+        dirs = paths.str.rpartition("/")
+        prefixes = np.where(has_images, parts[0] + "/images", dirs[0])
+        rel_paths = np.where(has_images, "/" + parts[2], "/" + dirs[2])
+        prefix_codes, path_prefixes = pd.factorize(prefixes)
+        arrays["FullPath::prefixes"] = np.asarray(path_prefixes, dtype=str)
+        arrays["FullPath::codes"] = prefix_codes.astype(np.int32)
+        arrays["FullPath::rel"] = rel_paths.astype(str)
+        return arrays
+
+    @staticmethod
+    def _from_arrays(arrays):
+        columns = {}
+        for col in arrays["__columns__"].tolist():
+            if f"{col}::values" in arrays:
+                columns[col] = arrays[f"{col}::values"]
+            else:
+                columns[col] = pd.Categorical.from_codes(
+                    arrays[f"{col}::codes"], arrays[f"{col}::categories"]
+                )
+        paths = (arrays["FullPath::prefixes"], arrays["FullPath::codes"], arrays["FullPath::rel"])
+        return pd.DataFrame(columns), paths
+
+    def calc_statistics(self, sample_size=None, seed=42, num_workers=None):
+        """
+        Calculate (or load cached) mean & std of every image in the data info.
+
+        Args:
+            sample_size (int, optional): Estimate from a seeded subsample of this size. Defaults to None(all).
+            seed (int, optional): Subsample seed. Defaults to 42.
+            num_workers (int, optional): Number of processes. Defaults to cpu count.
+
+        Returns:
+            mean (tuple): Channel means in [0, 1].
+            std (tuple): Channel stds in [0, 1].
+        """
+        return load_or_compute_statistics(
+            self.file_dir, self.data["FullPath"], num_workers=num_workers, sample_size=sample_size, seed=seed
+        )
+
+    def split_indices(self, val_size=0.2, crit_col="path", shuffle=True, random_state=32):
+        """
+        Split the data info to train and validation row indices.
+        Rows are grouped by crit_col so one group never ends up in both sets, and the age offset
+        filter is applied to the train rows.
+
+        Args:
+            val_size (float, optional): Ratio for validation set. Defaults to 0.2.
+            crit_col (str, optional): Split by column. Defaults to "path".
+            shuffle (bool, optional): Shuffle. Defaults to True.
+            random_state (int, optional): Random seed number. Defaults to 32.
+
+        Returns:
+            train_idxs (np.ndarray): Train set row positions
+            valid_idxs (np.ndarray): Validation set row positions
+        """
+        codes, groups = pd.factorize(self.data[crit_col], sort=True)
+        codes = np.where(codes < 0, len(groups), codes)  # missing values form their own (train) group
+        group_order = np.arange(len(groups))
+        if shuffle:
+            group_order = np.random.default_rng(random_state).permutation(len(groups))
+        is_valid_group = np.zeros(len(groups) + 1, dtype=bool)
+        is_valid_group[group_order[: int(len(groups) * val_size)]] = True
+        is_valid = is_valid_group[codes]
+
+        # age offset
+        age = self.data["age"].to_numpy()
+        age_offset = (age <= 25) | ((age >= 30) & (age <= 58)) | (age >= 60)
+
+        return np.flatnonzero(~is_valid & age_offset), np.flatnonzero(is_valid)
+
+    def split_dataset(self, val_size=0.2, crit_col="path", shuffle=True, random_state=32):
+        """
+        Split the data info to train info and validation info.
+
+        Args:
+            val_size (float, optional): Ratio for validation set. Defaults to 0.2.
+            crit_col (str, optional): Split by column. Defaults to "path".
+            shuffle (bool, optional): Shuffle. Defaults to True.
+            random_state (int, optional): Random seed number. Defaults to 32.
+
+        Returns:
+            train_df (pd.DataFrame): Train set info
+            valid_df (pd.DataFrame): Validation set info
+            split_result (pd.DataFrame): Split result(Distribution info for each feature)
+        """
+        train_idxs, valid_idxs = self.split_indices(val_size, crit_col, shuffle, random_state)
+        train_df = self.data.iloc[train_idxs]
+        valid_df = self.data.iloc[valid_idxs]
+
+        split_result = dict(origin=self.data, train=train_df, valid=valid_df)
+        split_result = self._split_result(split_result)
+
+        return train_df, valid_df, split_result
+
+    def _split_result(self, df_dict, col_list=["Mask", "Age", "Gender"]):
+        dist_list = []
+        for name, df in df_dict.items():
+            dist_df_list = []
+            for col in col_list:
+                # Dist. info
+                dist_count = pd.DataFrame(df[col].value_counts())
+                dist_count.columns = ["Count"]
+                dist_ratio = pd.DataFrame(df[col].value_counts(True))
+                dist_ratio.columns = ["Ratio"]
+
+                # Construct & append dataframe
+                _dist_df = pd.concat([dist_count, dist_ratio], axis=1)
+                _dist_df.index = pd.MultiIndex.from_product([[col], _dist_df.index])
+                dist_df_list.append(_dist_df)
+            dist_df = pd.concat(dist_df_list, axis=0)
+            dist_df.columns = pd.MultiIndex.from_product([[name], dist_df.columns])
+            dist_list.append(dist_df)
+        dist_info = pd.concat(dist_list, axis=1)
+
+        return dist_info
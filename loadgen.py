@@ -0,0 +1,104 @@
+# System Libs.
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+# Other Libs
+import numpy as np
+
+
+async def request(host, port, method, path, content=b""):
+    """
+    Send one HTTP/1.1 request to the inference server.
+
+    Returns:
+        status (int): HTTP status code.
+        body (dict): JSON response.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(content)}\r\n"
+        f"Connection: close\r\n\r\n".encode() + content
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    header, body = response.split(b"\r\n\r\n", 1)
+    return int(header.split(b" ", 2)[1]), json.loads(body)
+
+
+async def run_load(host, port, images, num_requests=1000, concurrency=32):
+    """
+    Drive the server with `concurrency` clients sending `num_requests` images in total.
+
+    Args:
+        host (str): Server host.
+        port (int): Server port.
+        images (sequence): Encoded image bytes, sent round-robin.
+        num_requests (int, optional): Total requests. Defaults to 1000.
+        concurrency (int, optional): Concurrent clients. Defaults to 32.
+
+    Returns:
+        result (dict): Throughput, client-side latency percentiles(ms) and error count.
+    """
+    latencies, errors = [], 0
+    counter = iter(range(num_requests))
+
+    async def client():
+        nonlocal errors
+        for idx in counter:
+            start = time.perf_counter()
+            status, _ = await request(host, port, "POST", "/predict", images[idx % len(images)])
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += status != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return dict(
+        requests=num_requests,
+        concurrency=concurrency,
+        errors=errors,
+        requests_per_sec=num_requests / elapsed,
+        latency_ms={f"p{q}": float(np.percentile(latencies, q)) for q in (50, 90, 95, 99)},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--image_dir",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_EVAL", "/opt/ml/input/data/eval") + "/images",
+        help="images sent to the server",
+    )
+    parser.add_argument(
+        "--num_images", type=int, default=256, help="images loaded into memory (default: 256)"
+    )
+    parser.add_argument("--num_requests", type=int, default=1000, help="total requests (default: 1000)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--output", type=str, default="", help="save the result as json")
+    args = parser.parse_args()
+
+    img_paths = sorted(
+        p for p in Path(args.image_dir).rglob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png")
+    )
+    images = [p.read_bytes() for p in img_paths[: args.num_images]]
+    assert images, f"{args.image_dir} 에 이미지가 없습니다"
+
+    result = {}
+    for concurrency in args.concurrency:
+        result[f"concurrency_{concurrency}"] = asyncio.run(
+            run_load(args.host, args.port, images, args.num_requests, concurrency)
+        )
+    result["server"] = asyncio.run(request(args.host, args.port, "GET", "/metrics"))[1]
+
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
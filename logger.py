@@ -1,8 +1,15 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import confusion_matrix
+import argparse
+import csv
+import glob
+import json
+import os
+import queue
+import threading
+import time
 
-from dataset import *
+import numpy as np
+
+LOGGER_BACKENDS = ["wandb", "jsonl", "csv", "none"]
 
 
 def get_lr(optimizer):
@@ -16,25 +23,291 @@ def get_lr(optimizer):
         return param_group["lr"]
 
 
-def save_confusion_matrix(num_classes, labels, preds, save_path):
+def save_confusion_matrix(matrix, save_path):
     """
     Saves confusion matrix that evaluates the accuracy of a classification.
+    Draws on its own Figure instead of the pyplot state machine, so nothing stays registered after
+    saving and it is safe to call from a background thread.
 
     Args:
-        num_classes: Number of classes
-        labels: Ground truth target labels
-        preds: Estimated target predictions
+        matrix: Confusion matrix counts (metrics.ConfusionMatrix or array, rows are ground truth)
         save_path: A path confusion matrix to be saved
     """
-    confusion = confusion_matrix(y_true=labels, y_pred=preds, normalize="true")
+    # plotting libraries load on first use, training and metric logging never import them
+    import pandas as pd
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    matrix = np.asarray(_counts(matrix), dtype=np.float64)
+    num_classes = len(matrix)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confusion = matrix / matrix.sum(axis=1, keepdims=True)
     df = pd.DataFrame(confusion, index=list(range(num_classes)), columns=list(range(num_classes)))
     df = df.fillna(0)
 
-    plt.figure(figsize=(10, 9))
-    plt.tight_layout()
-    plt.suptitle("Confusion Matrix")
-    sns.heatmap(df, cmap=sns.color_palette("Blues"), annot=True, fmt=".2f", linewidth=0.1, square=True)
-    plt.xlabel("Predicted")
-    plt.ylabel("True")
+    fig = Figure(figsize=(10, 9))
+    ax = fig.subplots()
+    fig.suptitle("Confusion Matrix")
+    sns.heatmap(df, ax=ax, cmap=sns.color_palette("Blues"), annot=True, fmt=".2f", linewidth=0.1, square=True)
+    ax.set_xlabel("Predicted")
+    ax.set_ylabel("True")
+
+    fig.savefig(save_path)
+    fig.clear()
+
+
+def _counts(matrix):
+    """Counts of a metrics.ConfusionMatrix (or tensor) as an array, without importing torch here."""
+    return np.asarray(matrix.numpy() if hasattr(matrix, "numpy") else matrix)
+
+
+def save_matrix(matrix, save_path, **info):
+    """
+    Saves raw confusion matrix counts to an npz file.
+
+    Args:
+        matrix: Confusion matrix counts (metrics.ConfusionMatrix or array, rows are ground truth)
+        save_path: A path of the npz file
+        info: Scalars stored with the counts (e.g. epoch, f1)
+    """
+    np.savez(save_path, counts=_counts(matrix), **info)
+
+
+def load_matrix(path):
+    """Reads counts and info saved by save_matrix."""
+    with np.load(path) as data:
+        info = {key: data[key].item() for key in data.files if key != "counts"}
+        return data["counts"], info
+
+
+class ConfusionMatrixWriter:
+    """
+    Saves confusion matrices without waiting on plotting.
+    `save` writes the raw counts to {save_path}.npz right away and queues {save_path}.png for a
+    background thread. When several renders of the same path are queued only the latest is drawn.
+    A failed render is reported and skipped, the npz can be rendered again with `python logger.py`.
+
+    Args:
+        render: Render PNGs, when False only the npz files are written
+    """
+
+    def __init__(self, render=True):
+        self.render = render
+        self.queue = queue.Queue()
+        self.latest = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        if render:
+            self.thread = threading.Thread(target=self._worker, name="confusion-matrix", daemon=True)
+            self.thread.start()
+
+    def save(self, matrix, save_path, **info):
+        matrix = np.array(_counts(matrix))
+        save_matrix(matrix, save_path + ".npz", **info)
+        if self.render:
+            png_path = save_path + ".png"
+            with self.lock:
+                queued = png_path in self.latest
+                self.latest[png_path] = matrix
+            if not queued:
+                self.queue.put(png_path)
+
+    def _worker(self):
+        while True:
+            png_path = self.queue.get()
+            if png_path is None:
+                break
+            with self.lock:
+                matrix = self.latest.pop(png_path)
+            try:
+                save_confusion_matrix(matrix, png_path)
+            except Exception as e:
+                print(f"Rendering {png_path} failed: {e!r}")
+
+    def close(self, timeout=120):
+        """Finish queued renders, waiting at most timeout seconds."""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f"Confusion matrix rendering did not finish in {timeout}s")
+
+
+class NoopLogger:
+    """Logging backend that drops everything."""
+
+    def log(self, metrics, step=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlLogger(NoopLogger):
+    """
+    Appends one JSON object per log call to a local file.
+
+    Args:
+        path: JSONL file path
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def log(self, metrics, step=None):
+        self.file.write(json.dumps({"time": time.time(), "step": step, **metrics}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvLogger(NoopLogger):
+    """
+    Appends metrics to a local csv in long format(time, step, key, value), so new keys need no new columns.
+
+    Args:
+        path: csv file path
+    """
+
+    def __init__(self, path):
+        is_new = not os.path.exists(path)
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(["time", "step", "key", "value"])
+
+    def log(self, metrics, step=None):
+        now = time.time()
+        self.writer.writerows([now, step, key, value] for key, value in metrics.items())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class WandbLogger(NoopLogger):
+    """
+    W&B backend. The run starts on the first log call, i.e. on the logging thread, so a slow
+    or unreachable server never delays training. Project / entity / name come from
+    wandb_setting/wandb_config.json when it exists.
+    With mode="offline" the run is stored under ./wandb and can be uploaded later with `wandb sync`.
+
+    Args:
+        config: Run config (e.g. vars(args))
+        mode: "online", "offline" or "disabled"
+        config_path: W&B setting json path
+    """
+
+    def __init__(self, config, mode="online", config_path="wandb_setting/wandb_config.json"):
+        self.config = config
+        self.mode = mode
+        self.config_path = config_path
+        self.run = None
+
+    def log(self, metrics, step=None):
+        if self.run is None:
+            import wandb
+
+            init = {}
+            if os.path.exists(self.config_path):
+                with open(self.config_path, "r") as f:
+                    init = json.load(f)["init"]
+            self.run = wandb.init(config=self.config, mode=self.mode, **init)
+        self.run.log(metrics)
+
+    def close(self):
+        if self.run is not None:
+            self.run.finish()
+
+
+class AsyncLogger:
+    """
+    Buffers metrics in a queue and hands them to the backends on a background thread.
+    `log` never blocks: when the queue is full the record is dropped and counted, and a backend that
+    raises is disabled with a warning instead of stopping training.
+
+    Args:
+        backends: Logging backends (WandbLogger, JsonlLogger, CsvLogger, NoopLogger)
+        max_queue: Maximum buffered records
+    """
+
+    def __init__(self, backends, max_queue=10000):
+        self.backends = list(backends)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._worker, name="metrics-logger", daemon=True)
+        self.thread.start()
+
+    def log(self, metrics, step=None):
+        try:
+            self.queue.put_nowait((dict(metrics), step))
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            for backend in list(self.backends):
+                try:
+                    backend.log(*record)
+                except Exception as e:
+                    print(f"Logging backend {type(backend).__name__} disabled: {e!r}")
+                    self.backends.remove(backend)
+
+    def close(self, timeout=60):
+        """Flush buffered records and close the backends, waiting at most timeout seconds."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f"Logging did not finish in {timeout}s, {self.queue.qsize()} records left")
+            return
+        for backend in self.backends:
+            backend.close()
+        if self.dropped:
+            print(f"Logging queue was full, {self.dropped} records dropped")
+
+
+def build_logger(backends, save_dir, config=None, wandb_mode="online"):
+    """
+    Build a non-blocking logger.
+
+    Args:
+        backends: Backend names in LOGGER_BACKENDS ("jsonl" / "csv" write metrics.jsonl / metrics.csv in save_dir)
+        save_dir: Experiment directory
+        config: Run config (e.g. vars(args))
+        wandb_mode: "online", "offline" or "disabled"
+
+    Returns:
+        logger (AsyncLogger): Logger
+    """
+    loggers = []
+    for backend in backends:
+        if backend == "wandb":
+            loggers.append(WandbLogger(config, mode=wandb_mode))
+        elif backend == "jsonl":
+            loggers.append(JsonlLogger(os.path.join(save_dir, "metrics.jsonl")))
+        elif backend == "csv":
+            loggers.append(CsvLogger(os.path.join(save_dir, "metrics.csv")))
+    return AsyncLogger(loggers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render confusion matrices saved as npz to PNG")
+    parser.add_argument("paths", nargs="+", help="npz files or directories holding them")
+    parser.add_argument("--output_dir", type=str, default="", help="(default: next to each npz file)")
+    args = parser.parse_args()
 
-    plt.savefig(save_path)
+    for path in args.paths:
+        npz_paths = sorted(glob.glob(os.path.join(path, "*.npz"))) if os.path.isdir(path) else [path]
+        for npz_path in npz_paths:
+            counts, info = load_matrix(npz_path)
+            png_path = os.path.splitext(npz_path)[0] + ".png"
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+                png_path = os.path.join(args.output_dir, os.path.basename(png_path))
+            save_confusion_matrix(counts, png_path)
+            print(f"{npz_path} -> {png_path} {info}")
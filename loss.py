@@ -19,7 +19,7 @@ class FocalLoss(nn.Module):
         self.reduction = reduction
 
     def forward(self, input_tensor, target_tensor):
-        log_prob = F.log_softmax(input_tensor, dim=-1)
+        log_prob = F.log_softmax(input_tensor.float(), dim=-1)
         prob = torch.exp(log_prob)
         return F.nll_loss(
             ((1 - prob) ** self.gamma) * log_prob,
@@ -45,7 +45,7 @@ class LabelSmoothingLoss(nn.Module):
         self.dim = dim
 
     def forward(self, pred, target):
-        pred = pred.log_softmax(dim=self.dim)
+        pred = pred.float().log_softmax(dim=self.dim)
         with torch.no_grad():
             true_dist = torch.zeros_like(pred)
             true_dist.fill_(self.smoothing / (self.cls - 1))
@@ -71,7 +71,7 @@ class F1Loss(nn.Module):
         assert y_pred.ndim == 2
         assert y_true.ndim == 1
         y_true = F.one_hot(y_true, self.classes).to(torch.float32)
-        y_pred = F.softmax(y_pred, dim=1)
+        y_pred = F.softmax(y_pred.float(), dim=1)
 
         tp = (y_true * y_pred).sum(dim=0).to(torch.float32)
         tn = ((1 - y_true) * (1 - y_pred)).sum(dim=0).to(torch.float32)
@@ -86,6 +86,38 @@ class F1Loss(nn.Module):
         return 1 - f1.mean()
 
 
+class MultiTaskLoss(nn.Module):
+    """
+    MultiTaskLoss
+    Sum of per-head losses for [mask | gender | age] logits(see model.MultiTaskResNet18)
+    against 18-class labels, decoded like MaskBaseDataset.decode_multi_class(mask * 6 + gender * 3 + age).
+
+    Args:
+        criterion_name : criterion used for every head
+        head_sizes : number of classes of mask, gender and age heads
+        weights : weight of each head loss
+    """
+    def __init__(self, criterion_name="cross_entropy", head_sizes=(3, 2, 3), weights=(1.0, 1.0, 1.0)):
+        super().__init__()
+        self.head_sizes = head_sizes
+        self.weights = weights
+        sized = criterion_name in ("label_smoothing", "f1")
+        self.criterions = nn.ModuleList(
+            [get_criterion(criterion_name, **({"classes": size} if sized else {})) for size in head_sizes]
+        )
+
+    def forward(self, outs, labels):
+        head_outs = torch.split(outs, self.head_sizes, dim=1)
+        head_labels = ((labels // 6) % 3, (labels // 3) % 2, labels % 3)  # mask, gender, age
+        losses = [
+            weight * criterion(head_out, head_label)
+            for weight, criterion, head_out, head_label in zip(
+                self.weights, self.criterions, head_outs, head_labels
+            )
+        ]
+        return sum(losses)
+
+
 _criterion_entrypoints = {
     "cross_entropy": nn.CrossEntropyLoss,
     "focal": FocalLoss,
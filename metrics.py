@@ -0,0 +1,67 @@
+import numpy as np
+import torch
+
+
+class ConfusionMatrix:
+    """
+    Confusion matrix kept on the training device.
+    Each step adds a batch with a single bincount, and exact accuracy / macro-F1 / per-class numbers
+    are derived from the accumulated counts, so the host only syncs when `compute` is called.
+
+    Args:
+        num_classes (int): Number of classes
+        device (torch.device): Device the matrix lives on
+    """
+
+    def __init__(self, num_classes, device=torch.device("cpu")):
+        self.num_classes = num_classes
+        self.matrix = torch.zeros((num_classes, num_classes), dtype=torch.int64, device=device)
+
+    @torch.no_grad()
+    def update(self, labels, preds):
+        """
+        Add a batch of predictions.
+
+        Args:
+            labels (torch.Tensor): Ground truth labels
+            preds (torch.Tensor): Predicted labels
+        """
+        index = labels.view(-1).long() * self.num_classes + preds.view(-1).long()
+        self.matrix += torch.bincount(index, minlength=self.num_classes ** 2).view_as(self.matrix)
+
+    def reset(self):
+        self.matrix.zero_()
+
+    def numpy(self):
+        """
+        Returns:
+            matrix (np.ndarray): Counts, rows are ground truth and columns are predictions.
+        """
+        return self.matrix.cpu().numpy()
+
+    def compute(self):
+        """
+        Derive metrics from the counts (host sync happens here).
+        Macro-F1 averages over classes that appear in labels or predictions, like sklearn's f1_score.
+
+        Returns:
+            result (dict): accuracy, f1(macro), per-class precision/recall/f1 and support.
+        """
+        matrix = self.numpy().astype(np.float64)
+        tp = np.diag(matrix)
+        support = matrix.sum(axis=1)
+        predicted = matrix.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(tp / predicted)
+            recall = np.nan_to_num(tp / support)
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        present = (support + predicted) > 0
+        total = support.sum()
+        return dict(
+            accuracy=tp.sum() / total if total else 0.0,
+            f1=f1[present].mean() if present.any() else 0.0,
+            precision=precision,
+            recall=recall,
+            class_f1=f1,
+            support=support.astype(np.int64),
+        )
@@ -8,6 +8,15 @@ import numpy as np
 import math
 
 
+def joint_log_probs(mask, gender, age):
+    """
+    Combine mask(3), gender(2) and age(3) logits into 18-class log-probabilities
+    in the label order mask * 6 + gender * 3 + age.
+    """
+    mask, gender, age = (F.log_softmax(logits.float(), dim=-1) for logits in (mask, gender, age))
+    return (mask[:, :, None, None] + gender[:, None, :, None] + age[:, None, None, :]).flatten(1)
+
+
 class BaseModel(nn.Module):
     def __init__(self, num_classes, freeze=[]):
         super().__init__()
@@ -41,12 +50,10 @@ class BaseModel(nn.Module):
 
 
 class ResNet18Pretrained(nn.Module):
-    def __init__(self, num_classes, freeze=[]):
+    def __init__(self, num_classes, freeze=[], pretrained=True):
         super().__init__()
-        self.net = models.resnet18(pretrained=True)
-        self.net.fc = torch.nn.Linear(
-            in_features=512, out_features=num_classes, bias=True
-        )
+        self.net = models.resnet18(pretrained=pretrained)
+        self.net.fc = torch.nn.Linear(in_features=512, out_features=num_classes, bias=True)
         torch.nn.init.xavier_uniform_(self.net.fc.weight)
         stdv = 1.0 / math.sqrt(self.net.fc.weight.size(1))
         self.net.fc.bias.data.uniform_(-stdv, stdv)
@@ -55,3 +62,47 @@ class ResNet18Pretrained(nn.Module):
 
     def forward(self, x):
         return self.net(x)
+
+
+class MultiTaskResNet18(nn.Module):
+    """
+    ResNet18 backbone shared by mask(3), gender(2) and age(3) heads.
+    Forward returns the head logits concatenated as [mask | gender | age], and `predict`
+    turns them into the 18-class answer(mask * 6 + gender * 3 + age) from a single forward pass.
+    """
+
+    head_sizes = (3, 2, 3)
+
+    def __init__(self, num_classes=18, freeze=[], pretrained=True):
+        super().__init__()
+        self.net = models.resnet18(pretrained=pretrained)
+        self.net.fc = nn.Identity()
+        self.heads = nn.ModuleList(
+            [nn.Linear(in_features=512, out_features=size) for size in self.head_sizes]
+        )
+        for head in self.heads:
+            torch.nn.init.xavier_uniform_(head.weight)
+            stdv = 1.0 / math.sqrt(head.weight.size(1))
+            head.bias.data.uniform_(-stdv, stdv)
+        for layer in freeze:
+            getattr(self.net, layer).requires_grad_(False)
+
+    def forward(self, x):
+        features = self.net(x)
+        return torch.cat([head(features) for head in self.heads], dim=1)
+
+    @classmethod
+    def split_logits(cls, outs):
+        """Split concatenated logits into (mask, gender, age) logits."""
+        return torch.split(outs, cls.head_sizes, dim=1)
+
+    @classmethod
+    def class_scores(cls, outs):
+        """18-class scores(joint log-probabilities), their argmax equals `predict`."""
+        return joint_log_probs(*cls.split_logits(outs))
+
+    @classmethod
+    def predict(cls, outs):
+        """Combine per-head argmax into the 18-class label."""
+        mask, gender, age = (logits.argmax(dim=1) for logits in cls.split_logits(outs))
+        return mask * 6 + gender * 3 + age
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+STAGES = ("data", "h2d", "forward", "backward", "optimizer", "metrics")
+
+
+class StepTimer:
+    """
+    Per-stage wall time of training steps.
+    `lap(stage)` adds the time since the previous lap to the stage, so calling it right after the
+    DataLoader yields measures the data wait separately from compute. On CUDA every lap synchronizes
+    the device so asynchronous kernels are charged to the stage that launched them.
+    When disabled every call returns immediately.
+
+    Args:
+        enabled (bool): Record timings.
+        device (torch.device): Training device.
+        log_path (str, optional): JSONL file that `log` appends summaries to. Defaults to None.
+    """
+
+    def __init__(self, enabled=False, device=torch.device("cpu"), log_path=None):
+        self.enabled = enabled
+        self.sync = enabled and device.type == "cuda"
+        self.log_path = log_path
+        self.times = {stage: [] for stage in STAGES}
+        self.last = None
+
+    def start(self):
+        """Start timing, e.g. right before iterating the DataLoader."""
+        if self.enabled:
+            self.last = time.perf_counter()
+
+    def lap(self, stage):
+        if not self.enabled:
+            return
+        if self.sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.times[stage].append(now - self.last)
+        self.last = now
+
+    def summary(self, prefix="Time/"):
+        """
+        Percentiles(ms) of every stage since the last summary, then reset.
+
+        Returns:
+            result (dict): {prefix}{stage}_p50 / _p90 / _p99 in ms, stage "step" is the sum of all stages.
+        """
+        if not self.enabled:
+            return {}
+        times = {stage: np.array(laps) * 1000 for stage, laps in self.times.items() if laps}
+        if len({len(laps) for laps in times.values()}) == 1:
+            times["step"] = sum(times.values())
+        result = {}
+        for stage, laps in times.items():
+            for q in (50, 90, 99):
+                result[f"{prefix}{stage}_p{q}"] = float(np.percentile(laps, q))
+        self.times = {stage: [] for stage in STAGES}
+        return result
+
+    def log(self, summary, **info):
+        """Append a summary with extra info(e.g. epoch, step) to the JSONL file."""
+        if self.enabled and self.log_path and summary:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({**info, **summary}) + "\n")
+
+
+def build_profiler(profile_steps, save_dir):
+    """
+    torch.profiler capturing a window of training steps, or a no-op.
+    Call `.start()` before training, `.step()` after every training step and `.stop()` at the end;
+    the trace is written for TensorBoard under save_dir/profiler.
+
+    Args:
+        profile_steps (sequence): (first step, last step) counted from 1, None to disable.
+        save_dir (str): Experiment directory.
+
+    Returns:
+        profiler (torch.profiler.profile or NoopProfiler): Profiler.
+    """
+    if not profile_steps:
+        return NoopProfiler()
+    first, last = profile_steps
+    warmup = 1 if first > 1 else 0
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(
+            wait=first - 1 - warmup, warmup=warmup, active=last - first + 1, repeat=1
+        ),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(os.path.join(save_dir, "profiler")),
+        record_shapes=True,
+    )
+
+
+class NoopProfiler:
+    """Stands in for torch.profiler.profile when profiling is off."""
+
+    def start(self):
+        pass
+
+    def step(self):
+        pass
+
+    def stop(self):
+        pass
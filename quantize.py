@@ -0,0 +1,185 @@
+# System Libs.
+import argparse
+import copy
+import io
+import json
+import os
+
+# Other Libs
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import default_dynamic_qconfig, get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from torch.utils.data import DataLoader, Subset
+
+from checkpoint import load_checkpoint, unwrap
+from export import InferenceModule, export_model, measure_latency, resolve_preprocess
+from metrics import ConfusionMatrix
+from transform import BatchBaseTransform, BatchNormalize
+
+QUANTIZE_METHODS = ["dynamic", "static"]
+
+
+def quantize_model(model, method, calib_batches=(), backend="x86"):
+    """
+    Post-training int8 quantization for CPU inference.
+    - dynamic : Linear layers(the classifier heads) get int8 weights, activations are quantized on the fly.
+    - static : Convolutions are quantized with activation ranges observed on calibration batches(FX graph mode),
+      Linear layers stay dynamic.
+
+    Args:
+        model (nn.Module): fp32 model, without the DataParallel wrapper.
+        method (str): "dynamic" or "static".
+        calib_batches (iterable): Normalized float image batches for static calibration.
+        backend (str, optional): Quantized engine. Defaults to "x86".
+
+    Returns:
+        quantized (nn.Module): int8 model.
+    """
+    torch.backends.quantized.engine = backend
+    model = copy.deepcopy(model).cpu().float().eval()
+    if method == "dynamic":
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    qconfig_mapping = get_default_qconfig_mapping(backend).set_object_type(nn.Linear, default_dynamic_qconfig)
+    calib_batches = iter(calib_batches)
+    first = next(calib_batches)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(first,))
+    with torch.no_grad():
+        prepared(first)
+        for images in calib_batches:
+            prepared(images)
+    return convert_fx(prepared)
+
+
+def model_size(model):
+    """Serialized state_dict size in bytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+@torch.no_grad()
+def evaluate(module, loader, num_classes):
+    """
+    Accuracy / macro-F1 of an InferenceModule on uint8 batches.
+
+    Returns:
+        result (dict): accuracy and f1.
+    """
+    metrics = ConfusionMatrix(num_classes)
+    for images, labels in loader:
+        metrics.update(labels, module(images).argmax(dim=-1))
+    result = metrics.compute()
+    return dict(accuracy=float(result["accuracy"]), f1=float(result["f1"]))
+
+
+def quantization_report(model, loader, calib_loader, mean, std, num_classes, backend="x86"):
+    """
+    Quantize with every method and compare against fp32.
+
+    Args:
+        model (nn.Module): fp32 model.
+        loader (DataLoader): Validation (uint8 image, label) batches.
+        calib_loader (DataLoader): Calibration (uint8 image, label) batches.
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+        num_classes (int): Number of classes.
+        backend (str, optional): Quantized engine. Defaults to "x86".
+
+    Returns:
+        models (dict): InferenceModule per method(fp32, dynamic, static).
+        report (dict): accuracy, f1, batch latency(ms) and size(MB) per method.
+    """
+    model = unwrap(model).cpu().float().eval()
+    normalize = BatchNormalize(mean, std)
+    calib_batches = [normalize(images) for images, _ in calib_loader]
+    models = {"fp32": InferenceModule(model, mean, std).eval()}
+    for method in QUANTIZE_METHODS:
+        quantized = quantize_model(model, method, calib_batches, backend=backend)
+        models[method] = InferenceModule(
+            quantized, mean, std, class_scores=models["fp32"].class_scores
+        ).eval()
+
+    images = next(iter(loader))[0]
+    report = {}
+    for method, module in models.items():
+        report[method] = dict(
+            **evaluate(module, loader, num_classes),
+            batch_ms=measure_latency(lambda: module, images)["batch_ms"],
+            size_mb=model_size(module.model) / 1024 ** 2,
+        )
+    return models, report
+
+
+if __name__ == "__main__":
+    from dataset import MaskBaseDataset, TrainInfo
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train/images"),
+    )
+    parser.add_argument("--file_dir", type=str, default="")
+    parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument("--val_ratio", type=float, default=0.2, help="ratio for validaton (default: 0.2)")
+    parser.add_argument("--model_dir", type=str, default=os.environ.get("SM_CHANNEL_MODEL", "./model"))
+    parser.add_argument("--name", type=str, default="exp")
+    parser.add_argument("--model_name", type=str, default="best.pt")
+    parser.add_argument(
+        "--label_col",
+        type=str,
+        default="Class",
+        help="label of the model (Class, ClassMask, ClassGender, ClassAge)",
+    )
+    parser.add_argument(
+        "--method", type=str, default="static", choices=QUANTIZE_METHODS, help="(default: static)"
+    )
+    parser.add_argument(
+        "--calib_size", type=int, default=512, help="validation images used for calibration (default: 512)"
+    )
+    parser.add_argument("--batch_size", type=int, default=64, help="input batch size (default: 64)")
+    parser.add_argument(
+        "--resize",
+        nargs=2,
+        type=int,
+        default=None,
+        help="resize size for image when you trained (default: from the checkpoint, else (512, 384))",
+    )
+    parser.add_argument("--mean", nargs=3, type=float, default=None, help="(default: from the checkpoint)")
+    parser.add_argument("--std", nargs=3, type=float, default=None, help="(default: from the checkpoint)")
+    parser.add_argument("--backend", type=str, default="x86", help="quantized engine (default: x86)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    args = parser.parse_args()
+
+    model_dir = os.path.join(args.model_dir, args.name)
+    model, preprocess = load_checkpoint(
+        os.path.join(model_dir, args.model_name), torch.device("cpu"), with_preprocess=True
+    )
+    # evaluate and export with the normalization the model was trained with
+    preprocess = resolve_preprocess(preprocess, args.resize, args.mean, args.std)
+    args.resize, args.mean, args.std = preprocess["resize"], preprocess["mean"], preprocess["std"]
+
+    data_info = TrainInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset)
+    _, valid_df, _ = data_info.split_dataset(args.val_ratio)
+    valid_set = MaskBaseDataset(valid_df, mean=args.mean, std=args.std, label_col=args.label_col)
+    valid_set.set_transform(BatchBaseTransform(resize=args.resize, mean=args.mean, std=args.std))
+    calib_idxs = np.random.default_rng(args.seed).permutation(len(valid_set))[: args.calib_size]
+    loader = DataLoader(valid_set, batch_size=args.batch_size, shuffle=False)
+    calib_loader = DataLoader(
+        Subset(valid_set, calib_idxs.tolist()), batch_size=args.batch_size, shuffle=False
+    )
+
+    models, report = quantization_report(
+        model, loader, calib_loader, args.mean, args.std, valid_set.num_classes, backend=args.backend
+    )
+
+    stem = os.path.splitext(args.model_name)[0]
+    out_path = os.path.join(model_dir, f"{stem}_int8.ts")
+    export_model(models[args.method], out_path, args.resize, args.mean, args.std)
+    report["artifact"] = dict(method=args.method, path=out_path)
+    with open(os.path.join(model_dir, f"{stem}_int8.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,297 @@
+# System Libs.
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Other Libs
+import numpy as np
+import torch
+from PIL import Image
+
+from dataset import MaskBaseDataset, TestDataset
+from export import is_artifact, load_artifact
+from inference import load_model
+from transform import BatchBaseTransform
+
+MASK_NAMES = ("wear", "incorrect", "not wear")
+GENDER_NAMES = ("male", "female")
+AGE_NAMES = ("< 30", ">= 30 and < 60", ">= 60")
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram in milliseconds.
+
+    Args:
+        bounds (sequence, optional): Bucket upper bounds in ms.
+    """
+
+    def __init__(self, bounds=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)):
+        self.bounds = np.array(bounds, dtype=np.float64)
+        self.counts = np.zeros(len(bounds) + 1, dtype=np.int64)
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[np.searchsorted(self.bounds, value)] += 1
+        self.total += value
+
+    def percentile(self, q):
+        """Upper bound of the bucket that holds the q-th percentile (inf for the overflow bucket)."""
+        count = self.counts.sum()
+        if count == 0:
+            return 0.0
+        bucket = np.searchsorted(np.cumsum(self.counts), q / 100 * count)
+        return float(self.bounds[bucket]) if bucket < len(self.bounds) else float("inf")
+
+    def summary(self):
+        count = int(self.counts.sum())
+        return dict(
+            count=count,
+            mean=self.total / count if count else 0.0,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+            buckets={f"<={bound:g}": int(n) for bound, n in zip(self.bounds, self.counts)},
+            overflow=int(self.counts[-1]),
+        )
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into dynamic micro-batches.
+    The first queued image opens a batch, which is sent to the model when it reaches `max_batch_size`
+    or `max_wait_ms` after it opened. The model runs in its own thread so the event loop keeps
+    accepting and decoding requests meanwhile.
+
+    Args:
+        score_batch (callable): Image batch -> 18-class scores.
+        device (torch.device): Device the model runs on.
+        max_batch_size (int): Maximum images per forward pass.
+        max_wait_ms (float): Maximum time the first image of a batch waits for others.
+    """
+
+    def __init__(self, score_batch, device, max_batch_size=32, max_wait_ms=5):
+        self.score_batch = score_batch
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.model_thread = ThreadPoolExecutor(max_workers=1)
+        self.histograms = {name: LatencyHistogram() for name in ("queue", "model")}
+        self.batch_sizes = LatencyHistogram(bounds=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+    async def predict(self, image):
+        """Queue a transformed image and wait for its 18-class answer."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, future, time.perf_counter()))
+        return await future
+
+    @torch.no_grad()
+    def _run(self, images):
+        batch = torch.stack(images).to(self.device)
+        return self.score_batch(batch).argmax(dim=-1).cpu().tolist()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            start = time.perf_counter()
+            for _, _, queued in items:
+                self.histograms["queue"].add((start - queued) * 1000)
+            try:
+                preds = await loop.run_in_executor(
+                    self.model_thread, self._run, [image for image, _, _ in items]
+                )
+            except Exception as e:
+                for _, future, _ in items:
+                    if not future.done():  # the client may have disconnected meanwhile
+                        future.set_exception(e)
+                continue
+            self.histograms["model"].add((time.perf_counter() - start) * 1000)
+            self.batch_sizes.add(len(items))
+            for pred, (_, future, _) in zip(preds, items):
+                if not future.done():
+                    future.set_result(pred)
+
+
+class InferenceServer:
+    """
+    Long-lived local HTTP inference service.
+    - POST /predict : image file bytes -> 18-class answer with decoded mask / gender / age
+    - GET /metrics : decode, queue, model and total latency histograms(ms) and batch sizes
+    - GET /health : ok
+
+    Args:
+        score_batch (callable): Image batch -> 18-class scores.
+        transform (callable): PIL image -> image tensor(TestDataset transform).
+        device (torch.device): Device the model runs on.
+        decode_workers (int): Number of image decoding threads.
+        max_batch_size (int): Maximum images per forward pass.
+        max_wait_ms (float): Maximum time the first image of a batch waits for others.
+    """
+
+    def __init__(self, score_batch, transform, device, decode_workers=4, max_batch_size=32, max_wait_ms=5):
+        self.transform = transform
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+        self.batcher = MicroBatcher(
+            score_batch, device, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+        self.histograms = {name: LatencyHistogram() for name in ("decode", "total")}
+        self.batcher_task = None
+
+    def start_batcher(self):
+        """Start the micro-batching loop, restarted by `on_batcher_done` if it ever dies."""
+        self.batcher_task = asyncio.create_task(self.batcher.run())
+        self.batcher_task.add_done_callback(self.on_batcher_done)
+
+    def on_batcher_done(self, task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        print(f"Micro-batcher stopped, restarting: {error!r}")
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__)
+        self.start_batcher()
+
+    def decode(self, content):
+        return self.transform(Image.open(io.BytesIO(content)).convert("RGB"))
+
+    async def predict(self, content):
+        start = time.perf_counter()
+        image = await asyncio.get_running_loop().run_in_executor(self.decode_pool, self.decode, content)
+        self.histograms["decode"].add((time.perf_counter() - start) * 1000)
+        ans = await self.batcher.predict(image)
+        latency = (time.perf_counter() - start) * 1000
+        self.histograms["total"].add(latency)
+
+        mask, gender, age = MaskBaseDataset.decode_multi_class(ans)
+        return dict(
+            ans=ans,
+            mask=mask,
+            gender=gender,
+            age=age,
+            mask_name=MASK_NAMES[mask],
+            gender_name=GENDER_NAMES[gender],
+            age_name=AGE_NAMES[age],
+            latency_ms=latency,
+        )
+
+    def metrics(self):
+        histograms = {**self.histograms, **self.batcher.histograms}
+        return dict(
+            latency_ms={name: histogram.summary() for name, histogram in histograms.items()},
+            batch_size=self.batcher.batch_sizes.summary(),
+        )
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, value = line.decode("latin-1").split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            content = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method == "POST" and path == "/predict":
+                status, body = 200, await self.predict(content)
+            elif method == "GET" and path == "/metrics":
+                status, body = 200, self.metrics()
+            elif method == "GET" and path == "/health":
+                status, body = 200, dict(status="ok")
+            else:
+                status, body = 404, dict(error=f"{method} {path} not found")
+        except Exception as e:
+            status, body = 400, dict(error=repr(e))
+
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode()
+            + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        self.start_batcher()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port} (POST /predict, GET /metrics)")
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                self.batcher_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", type=str, default=os.environ.get("SM_CHANNEL_MODEL", "./model"))
+    parser.add_argument("--name", type=str, default="exp")
+    parser.add_argument(
+        "--model_name", type=str, default="best.pt", help="checkpoint or artifact from export.py(.ts, .onnx)"
+    )
+    parser.add_argument(
+        "--resize",
+        nargs=2,
+        type=int,
+        default=(512, 384),
+        help="resize size for image when you trained (default: (512, 384))",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--decode_workers", type=int, default=4, help="image decoding threads (default: 4)")
+    parser.add_argument("--max_batch_size", type=int, default=32, help="micro-batch size limit (default: 32)")
+    parser.add_argument(
+        "--max_wait_ms", type=float, default=5, help="time a micro-batch waits for requests (default: 5)"
+    )
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model_dir = os.path.join(args.model_dir, args.name)
+    if is_artifact(args.model_name):
+        model, meta = load_artifact(os.path.join(model_dir, args.model_name), device)
+        device = torch.device(meta["device"])  # quantized artifacts run on CPU
+        transform = BatchBaseTransform(meta["resize"], meta["mean"], meta["std"])
+        class_scores = None
+    else:
+        model = load_model(model_dir, device, args.model_name).to(device)
+        model.eval()
+        transform = TestDataset([], args.resize).transform
+        class_scores = getattr(getattr(model, "module", model), "class_scores", None)
+
+    def score_batch(images):
+        outs = model(images)
+        return class_scores(outs) if class_scores else outs
+
+    server = InferenceServer(
+        score_batch,
+        transform,
+        device,
+        decode_workers=args.decode_workers,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+    asyncio.run(server.serve(args.host, args.port))
@@ -1,10 +1,12 @@
 import os
 import glob
+import functools
 from pathlib import Path
 import random
 import re
 
 import torch
+import torch.distributed as dist
 
 import numpy as np
 
@@ -14,6 +16,8 @@ class SettingsHelper:
     Helper class that helps to set the enviornment.
     By default, it fixes random seed to a user defined value and chooses
     which device to use for calculation.
+    When launched with torchrun (WORLD_SIZE > 1), it also joins the process group
+    (nccl on GPU, gloo on CPU) and pins each process to its local GPU or share of CPU cores.
 
     Args:
         args (argparse.Namespace): Input arguments
@@ -22,9 +26,77 @@ class SettingsHelper:
 
     def __init__(self, args, device=torch.device("cuda")):
         self.args = args
+        self.rank = int(os.environ.get("RANK", 0))
+        self.local_rank = int(os.environ.get("LOCAL_RANK", 0))
+        self.world_size = int(os.environ.get("WORLD_SIZE", 1))
+        if self.is_distributed:
+            device = self._init_distributed(device)
         self.device = device
         self._set_seed(seed=args.seed)
 
+    @property
+    def is_distributed(self):
+        return self.world_size > 1
+
+    @property
+    def is_main(self):
+        """Whether this process writes checkpoints, logs and prints(rank 0)."""
+        return self.rank == 0
+
+    def _init_distributed(self, device):
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", self.world_size))
+        if device.type == "cuda":
+            device = torch.device("cuda", self.local_rank)
+            torch.cuda.set_device(device)
+        else:
+            torch.set_num_threads(max(1, os.cpu_count() // local_world_size))
+        if not dist.is_initialized():
+            dist.init_process_group(backend="nccl" if device.type == "cuda" else "gloo")
+        return device
+
+    def num_workers(self):
+        """
+        DataLoader workers per process: --num_workers if given, otherwise every process gets an equal
+        share so all processes together use every core once.
+        """
+        if getattr(self.args, "num_workers", None) is not None:
+            return self.args.num_workers
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", self.world_size))
+        return os.cpu_count() // local_world_size
+
+    def all_reduce(self, tensor):
+        """
+        Sum a tensor over all processes in place(no-op without distributed training).
+
+        Args:
+            tensor (torch.Tensor): Tensor to reduce
+        """
+        if self.is_distributed:
+            dist.all_reduce(tensor)
+        return tensor
+
+    def barrier(self):
+        """Wait until every process gets here(no-op without distributed training)."""
+        if self.is_distributed:
+            dist.barrier()
+
+    def broadcast_object(self, obj):
+        """
+        Rank 0's value of a picklable object on every process(obj itself without distributed training).
+
+        Args:
+            obj: Object to send from rank 0, ignored on the other ranks
+        """
+        if self.is_distributed:
+            objects = [obj]
+            dist.broadcast_object_list(objects, src=0)
+            obj = objects[0]
+        return obj
+
+    def cleanup(self):
+        if self.is_distributed and dist.is_initialized():
+            dist.destroy_process_group()
+
     def _set_seed(self, seed):
         torch.manual_seed(seed)
         torch.cuda.manual_seed(seed)
@@ -55,3 +127,49 @@ class SettingsHelper:
             i = [int(m.groups()[0]) for m in matches if m]
             n = max(i) + 1 if i else 2
             return f"{save_dir}{n}"
+
+    def resume_candidates(self, filename):
+        """
+        Existing `filename` files in the directories get_save_dir creates({name}, {name}2, ...), newest first.
+
+        Args:
+            filename (str): File name inside a save directory
+        """
+        save_dir = Path(os.path.join(self.args.model_dir, self.args.name))
+        pattern = re.compile(rf"{re.escape(save_dir.name)}\d+")
+        dirs = [save_dir] + [
+            Path(d) for d in glob.glob(f"{glob.escape(str(save_dir))}*") if pattern.fullmatch(Path(d).name)
+        ]
+        paths = [d / filename for d in dirs if (d / filename).is_file()]
+        return [str(p) for p in sorted(paths, key=lambda p: p.stat().st_mtime, reverse=True)]
+
+
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def get_autocast(device, precision="fp32"):
+    """
+    Returns a context manager factory that runs forward and loss under autocast.
+
+    Args:
+        device (torch.device): Device to use
+        precision (str): One of "fp32", "bf16", "fp16"
+    """
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return functools.partial(torch.autocast, device_type=device.type, enabled=False)
+    return functools.partial(torch.autocast, device_type=device.type, dtype=dtype)
+
+
+def get_grad_scaler(device, precision="fp32"):
+    """
+    Returns a gradient scaler, which is only enabled for fp16 (bf16 has the fp32 exponent range).
+
+    Args:
+        device (torch.device): Device to use
+        precision (str): One of "fp32", "bf16", "fp16"
+    """
+    enabled = precision == "fp16"
+    if hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler(device.type, enabled=enabled)
+    return torch.cuda.amp.GradScaler(enabled=enabled and device.type == "cuda")
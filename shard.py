@@ -0,0 +1,126 @@
+# System Libs.
+import argparse
+import io
+import mmap
+import os
+from pathlib import Path
+
+# Other Libs
+import pandas as pd
+from PIL import Image
+from tqdm import tqdm
+
+INDEX_FILE = "index.csv"
+SHARD_COLUMNS = ["Shard", "Offset", "Length"]
+
+
+def pack_shards(data, img_paths, out_dir, shard_size=256 * 1024 ** 2):
+    """
+    Pack image files into a few large shard files with an index.
+    Each shard is the raw encoded image bytes concatenated; the index is the given metadata with
+    `Shard`, `Offset` and `Length` columns added, saved as `index.csv` in out_dir.
+
+    Args:
+        data (pd.DataFrame): Metadata, one row per image.
+        img_paths (sequence): Image path of each row.
+        out_dir (str or pathlib.Path): Output directory.
+        shard_size (int, optional): Maximum bytes per shard. Defaults to 256MB.
+
+    Returns:
+        index (pd.DataFrame): Shard index.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    shards, offsets, lengths = [], [], []
+    shard, offset = 0, 0
+    f = open(out_dir.joinpath(shard_name(shard)), "wb")
+    for img_path in tqdm(img_paths):
+        with open(img_path, "rb") as img_file:
+            content = img_file.read()
+        if offset and offset + len(content) > shard_size:
+            f.close()
+            shard, offset = shard + 1, 0
+            f = open(out_dir.joinpath(shard_name(shard)), "wb")
+        f.write(content)
+        shards.append(shard)
+        offsets.append(offset)
+        lengths.append(len(content))
+        offset += len(content)
+    f.close()
+
+    index = data.reset_index(drop=True).copy()
+    index["Shard"], index["Offset"], index["Length"] = shards, offsets, lengths
+    index.to_csv(out_dir.joinpath(INDEX_FILE), index=False)
+    return index
+
+
+def shard_name(shard):
+    return f"shard-{shard:05d}.bin"
+
+
+class ShardReader:
+    """
+    Reads images from shard files by (shard, offset, length).
+    Shards are memory-mapped lazily in each process, so the reader can be sent to DataLoader workers.
+
+    Args:
+        shard_dir (str or pathlib.Path): Directory that contains the shards.
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = Path(shard_dir)
+        self._maps = {}
+
+    def read(self, shard, offset, length):
+        """
+        Read an image.
+
+        Args:
+            shard (int): Shard number.
+            offset (int): Byte offset in the shard.
+            length (int): Byte length of the encoded image.
+
+        Returns:
+            image (Image): Image
+        """
+        if shard not in self._maps:
+            with open(self.shard_dir.joinpath(shard_name(shard)), "rb") as f:
+                self._maps[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return Image.open(io.BytesIO(self._maps[shard][offset : offset + length]))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+
+if __name__ == "__main__":
+    from info import TrainInfo
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file_dir", type=str, default="", help="metadata csv (train) or info.csv (eval)")
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train/images"),
+    )
+    parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument(
+        "--path_col",
+        type=str,
+        default="FullPath",
+        help="path column (default: FullPath), other columns are joined to --data_dir (e.g. ImageID)",
+    )
+    parser.add_argument("--out_dir", type=str, required=True)
+    parser.add_argument("--shard_size", type=int, default=256, help="maximum shard size in MB (default: 256)")
+    args = parser.parse_args()
+
+    if args.path_col == "FullPath":
+        data = TrainInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset).data
+        img_paths = data["FullPath"]
+    else:
+        data = pd.read_csv(args.file_dir)
+        img_paths = [os.path.join(args.data_dir, p) for p in data[args.path_col]]
+    index = pack_shards(data, img_paths, args.out_dir, shard_size=args.shard_size * 1024 ** 2)
+    print(f"Packed {len(index)} images into {index['Shard'].max() + 1} shards at {args.out_dir}")
@@ -0,0 +1,143 @@
+# System Libs.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+# Other Libs
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+
+def _accumulate(img_paths):
+    """
+    Accumulate per-channel pixel histograms of images (runs in a worker process).
+    Histograms keep the result exact while avoiding int32/float copies of every image.
+
+    Args:
+        img_paths (sequence): Image paths.
+
+    Returns:
+        hist (np.ndarray): (3, 256) int64 pixel counts per channel.
+    """
+    hist = np.zeros((3, 256), dtype=np.int64)
+    for img_path in img_paths:
+        image = np.asarray(Image.open(img_path).convert("RGB"))
+        for channel in range(3):
+            hist[channel] += np.bincount(image[..., channel].ravel(), minlength=256)
+    return hist
+
+
+def compute_statistics(img_paths, num_workers=None, sample_size=None, seed=42, chunk_size=64):
+    """
+    Calculate channel mean & std of images on a process pool.
+
+    Args:
+        img_paths (sequence): Image paths.
+        num_workers (int, optional): Number of processes. Defaults to cpu count.
+        sample_size (int, optional): Estimate from a seeded subsample of this size. Defaults to None(all).
+        seed (int, optional): Subsample seed. Defaults to 42.
+        chunk_size (int, optional): Images per task. Defaults to 64.
+
+    Returns:
+        mean (tuple): Channel means in [0, 1].
+        std (tuple): Channel stds in [0, 1].
+    """
+    img_paths = list(img_paths)
+    if sample_size and sample_size < len(img_paths):
+        rng = np.random.default_rng(seed)
+        img_paths = [img_paths[i] for i in sorted(rng.choice(len(img_paths), sample_size, replace=False))]
+    chunks = [img_paths[start : start + chunk_size] for start in range(0, len(img_paths), chunk_size)]
+
+    hist = np.zeros((3, 256), dtype=np.int64)
+    with multiprocessing.Pool(num_workers or multiprocessing.cpu_count()) as pool:
+        for chunk_hist in tqdm(pool.imap_unordered(_accumulate, chunks), total=len(chunks)):
+            hist += chunk_hist
+
+    values = np.arange(256, dtype=np.float64) / 255
+    count = hist.sum(axis=1).astype(np.float64)
+    mean = (hist @ values) / count
+    std = np.sqrt(np.maximum((hist @ values ** 2) / count - mean ** 2, 0))
+    return tuple(mean.tolist()), tuple(std.tolist())
+
+
+def load_or_compute_statistics(file_dir, img_paths, num_workers=None, sample_size=None, seed=42):
+    """
+    Return cached statistics of a metadata file, computing and saving them if needed.
+    Results are saved next to the metadata csv(`<name>.stats.json`), keyed by a hash of the csv
+    contents, the image paths and the sampling options.
+
+    Args:
+        file_dir (str or pathlib.Path): Metadata csv file path.
+        img_paths (sequence): Image paths.
+        num_workers (int, optional): Number of processes. Defaults to cpu count.
+        sample_size (int, optional): Estimate from a seeded subsample of this size. Defaults to None(all).
+        seed (int, optional): Subsample seed. Defaults to 42.
+
+    Returns:
+        mean (tuple): Channel means in [0, 1].
+        std (tuple): Channel stds in [0, 1].
+    """
+    file_dir = Path(file_dir)
+    img_paths = [str(p) for p in img_paths]
+    digest = hashlib.sha1(file_dir.read_bytes())
+    digest.update("\n".join(img_paths).encode())
+    digest.update(f"{sample_size}/{seed}".encode())
+    key = digest.hexdigest()
+
+    stats_file = file_dir.with_suffix(".stats.json")
+    saved = {}
+    if stats_file.exists():
+        with open(stats_file, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    if key in saved:
+        return tuple(saved[key]["mean"]), tuple(saved[key]["std"])
+
+    print("Calculating statistics... This might take a while")
+    mean, std = compute_statistics(img_paths, num_workers=num_workers, sample_size=sample_size, seed=seed)
+    saved[key] = dict(mean=mean, std=std, num_images=len(img_paths), sample_size=sample_size, seed=seed)
+    tmp_file = stats_file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(saved, f, indent=4)
+    os.replace(tmp_file, stats_file)
+    return mean, std
+
+
+if __name__ == "__main__":
+    from info import TrainInfo
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file_dir", type=str, default="")
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train/images"),
+    )
+    parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument("--sample_size", type=int, default=0, help="subsample size (default: 0, all images)")
+    parser.add_argument("--seed", type=int, default=42, help="subsample seed (default: 42)")
+    parser.add_argument("--num_workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument(
+        "--report",
+        type=str,
+        default="channel",
+        choices=["channel", "split", "all"],
+        help="channel mean/std, train/valid label distribution or both (default: channel)",
+    )
+    parser.add_argument(
+        "--val_ratio", type=float, default=0.2, help="ratio for --report split (default: 0.2)"
+    )
+    args = parser.parse_args()
+
+    data_info = TrainInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset)
+    if args.report in ("split", "all"):
+        _, _, split_result = data_info.split_dataset(args.val_ratio)
+        print(split_result.to_string())
+    if args.report in ("channel", "all"):
+        mean, std = data_info.calc_statistics(
+            sample_size=args.sample_size, seed=args.seed, num_workers=args.num_workers
+        )
+        print(f"mean: {mean}\nstd: {std}")
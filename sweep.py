@@ -0,0 +1,327 @@
+# System Libs.
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TRIALS_FILE = "trials.json"
+LEADERBOARD_FILE = "leaderboard.csv"
+
+
+def sample_trials(parameters, num_trials=0, seed=42):
+    """
+    Trial configurations from a search space.
+    Every parameter is either a list of choices or a range {"min", "max", "log"(optional), "type"(optional)}.
+    With num_trials=0 and only choices, the full grid is returned; otherwise num_trials random samples.
+
+    Args:
+        parameters (dict): train.py option name -> choices or range.
+        num_trials (int, optional): Number of random trials, 0 for the grid. Defaults to 0.
+        seed (int, optional): Sampling seed. Defaults to 42.
+
+    Returns:
+        trials (list): train.py option name -> value, one dict per trial.
+    """
+    names = list(parameters)
+    if not num_trials:
+        assert all(
+            isinstance(parameters[name], list) for name in names
+        ), "범위(min/max) 파라미터는 --num_trials 가 필요합니다"
+        return [
+            dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))
+        ]
+
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(num_trials):
+        trial = {}
+        for name in names:
+            space = parameters[name]
+            if isinstance(space, list):
+                trial[name] = rng.choice(space)
+            elif space.get("log"):
+                trial[name] = math.exp(rng.uniform(math.log(space["min"]), math.log(space["max"])))
+            else:
+                trial[name] = rng.uniform(space["min"], space["max"])
+            if isinstance(space, dict) and space.get("type") == "int":
+                trial[name] = int(round(trial[name]))
+        trials.append(trial)
+    return trials
+
+
+def to_argv(options):
+    """train.py command line arguments from option name -> value (lists expand, bools follow `type=bool`)."""
+    argv = []
+    for name, value in options.items():
+        if isinstance(value, list):
+            if value:  # e.g. --freeze [] keeps the default
+                argv += [f"--{name}"] + [str(v) for v in value]
+        elif isinstance(value, bool):
+            argv += [f"--{name}", "true" if value else ""]
+        else:
+            argv += [f"--{name}", str(value)]
+    return argv
+
+
+def format_value(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def rungs(min_epochs, max_epochs, eta):
+    """Epoch budgets of successive halving: min_epochs * eta^k, ending at max_epochs."""
+    budgets = []
+    epochs = min_epochs
+    while epochs < max_epochs:
+        budgets.append(epochs)
+        epochs *= eta
+    return budgets + [max_epochs]
+
+
+def read_val_f1(trial_dir):
+    """Validation f1 per epoch from the trial's metrics.jsonl (a repeated epoch keeps its last value)."""
+    f1 = {}
+    path = os.path.join(trial_dir, "metrics.jsonl")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "Val/f1" in record and "epoch" in record:
+                    f1[record["epoch"]] = record["Val/f1"]
+    return f1
+
+
+def gpu_count():
+    import torch
+
+    return torch.cuda.device_count()
+
+
+def build_caches(train_args, resizes, cache_dir):
+    """
+    Decode every image once per resize into the shared memory-mapped cache(cache.ImageCache).
+    Trials open the same cache files read-only, so the OS page cache holds one copy for all of them.
+    """
+    from cache import ImageCache
+    from info import TrainInfo
+
+    data_info = TrainInfo(
+        file_dir=train_args.file_dir, data_dir=train_args.data_dir, new_dataset=train_args.new_dataset
+    )
+    for resize in resizes:
+        cache = ImageCache.from_info(data_info, cache_dir, resize).load_or_build()
+        print(f"Shared image cache {cache.root}")
+
+
+class Sweep:
+    """
+    Offline hyperparameter sweep over train.py with successive halving.
+    Every trial is a train.py process writing to {sweep_dir}/trial_{N}(N zero-padded to one width, at
+    least 3 digits). All trials first train for the first rung's epochs; the best 1/eta by validation
+    f1 continue (train.py --resume) to the next rung, the rest stop. Up to `max_parallel` trials run at
+    once, each with its share of the CPU cores(or its own GPU).
+
+    Args:
+        sweep_dir (str): Directory for trials, trials.json and the leaderboard.
+        trials (list): train.py option name -> value, one dict per trial.
+        train_argv (list): train.py arguments shared by every trial.
+        rungs (list): Epoch budgets of successive halving.
+        eta (int): Keep the best 1/eta of the trials at every rung.
+        max_parallel (int): Concurrent trials.
+        num_gpus (int, optional): GPUs, trial slots are pinned to them round-robin. Defaults to 0.
+    """
+
+    def __init__(self, sweep_dir, trials, train_argv, rungs, eta=3, max_parallel=1, num_gpus=0):
+        self.sweep_dir = sweep_dir
+        self.trials = [
+            dict(id=idx, params=params, status="pending", epochs=0) for idx, params in enumerate(trials)
+        ]
+        # equal-width ids: no trial name is another one plus digits, which --resume would match as {name}N
+        self.id_width = max(3, len(str(len(trials) - 1)))
+        self.train_argv = train_argv
+        self.rungs = rungs
+        self.eta = eta
+        self.max_parallel = max_parallel
+        self.num_gpus = num_gpus
+
+    def trial_dir(self, trial):
+        return os.path.join(self.sweep_dir, f"trial_{trial['id']:0{self.id_width}d}")
+
+    def run_trial(self, trial, epochs, slot):
+        # --dump keeps the trial directory, --resume continues a promoted trial from its last epoch
+        options = dict(
+            model_dir=self.sweep_dir,
+            name=os.path.basename(self.trial_dir(trial)),
+            dump=True,
+            resume=True,
+            epochs=epochs,
+        )
+        argv = [sys.executable, os.path.join(ROOT, "train.py"), *self.train_argv, *to_argv(trial["params"])]
+        argv += to_argv(options)
+        env = dict(os.environ, WANDB_MODE="disabled")
+        # DataLoader workers and intra-op threads are split between the concurrent trials
+        env["LOCAL_WORLD_SIZE"] = str(self.max_parallel)
+        env["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // self.max_parallel))
+        if self.num_gpus:
+            env["CUDA_VISIBLE_DEVICES"] = str(slot % self.num_gpus)
+
+        os.makedirs(self.trial_dir(trial), exist_ok=True)
+        with open(os.path.join(self.trial_dir(trial), "train.log"), "a", encoding="utf-8") as log:
+            returncode = subprocess.run(argv, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+        trial["f1"] = read_val_f1(self.trial_dir(trial))
+        trial["epochs"] = max(trial["f1"], default=0)
+        if returncode != 0:
+            trial["status"] = f"failed({returncode})"
+        return trial
+
+    def run_rung(self, trials, epochs):
+        slots = list(range(self.max_parallel))
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+
+            def run(trial):
+                slot = slots.pop()
+                try:
+                    return self.run_trial(trial, epochs, slot)
+                finally:
+                    slots.append(slot)
+
+            return list(pool.map(run, trials))
+
+    def best_f1(self, trial, epochs=None):
+        values = [f1 for epoch, f1 in trial.get("f1", {}).items() if epochs is None or epoch <= epochs]
+        return max(values, default=-1.0)
+
+    def run(self):
+        alive = list(self.trials)
+        for rung, epochs in enumerate(self.rungs):
+            print(f"Rung {rung}: {len(alive)} trials to {epochs} epochs")
+            for trial in alive:
+                trial["status"] = "running"
+            self.run_rung(alive, epochs)
+            alive = [trial for trial in alive if trial["status"] == "running"]
+            alive.sort(key=lambda trial: self.best_f1(trial, epochs), reverse=True)
+            if rung == len(self.rungs) - 1:
+                for trial in alive:
+                    trial["status"] = "completed"
+                break
+            keep = max(1, len(alive) // self.eta)
+            for trial in alive[keep:]:
+                trial["status"] = f"stopped@{epochs}"
+            alive = alive[:keep]
+            self.write_leaderboard()
+        return self.write_leaderboard()
+
+    def leaderboard(self):
+        rows = []
+        for trial in self.trials:
+            f1 = trial.get("f1", {})
+            best_epoch = max(f1, key=f1.get) if f1 else None
+            rows.append(
+                dict(
+                    trial=os.path.basename(self.trial_dir(trial)),
+                    status=trial["status"],
+                    epochs=trial["epochs"],
+                    best_f1=self.best_f1(trial) if f1 else None,
+                    best_epoch=best_epoch,
+                    **{name: format_value(value) for name, value in trial["params"].items()},
+                )
+            )
+        rows.sort(key=lambda row: -1.0 if row["best_f1"] is None else row["best_f1"], reverse=True)
+        return [dict(rank=rank, **row) for rank, row in enumerate(rows, 1)]
+
+    def write_leaderboard(self):
+        rows = self.leaderboard()
+        with open(os.path.join(self.sweep_dir, LEADERBOARD_FILE), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline hyperparameter sweep, arguments not listed here are passed to every train.py trial"
+    )
+    parser.add_argument(
+        "--space",
+        type=str,
+        default="sweep_setting/search_space.json",
+        help="search space json with `parameters` and optional `fixed` train.py options",
+    )
+    parser.add_argument("--sweep_dir", type=str, default="./sweep", help="(default: ./sweep)")
+    parser.add_argument(
+        "--num_trials", type=int, default=0, help="random trials, 0 for the full grid (default: 0)"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="trial sampling seed (default: 42)")
+    parser.add_argument("--min_epochs", type=int, default=1, help="epochs of the first rung (default: 1)")
+    parser.add_argument("--max_epochs", type=int, default=9, help="epochs of the last rung (default: 9)")
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta trials per rung (default: 3)")
+    parser.add_argument(
+        "--max_parallel", type=int, default=0, help="concurrent trials (default: 0, one per GPU or 4 cores)"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="./cache",
+        help="shared decoded image cache, empty to let every trial decode images (default: ./cache)",
+    )
+    args, train_argv = parser.parse_known_args()
+
+    with open(args.space, "r", encoding="utf-8") as f:
+        space = json.load(f)
+    os.makedirs(args.sweep_dir, exist_ok=True)
+    trials_file = os.path.join(args.sweep_dir, TRIALS_FILE)
+    if os.path.exists(trials_file):  # re-running a sweep resumes its trials
+        with open(trials_file, "r", encoding="utf-8") as f:
+            trials = json.load(f)
+    else:
+        trials = sample_trials(space["parameters"], args.num_trials, args.seed)
+        with open(trials_file, "w", encoding="utf-8") as f:
+            json.dump(trials, f, indent=4)
+
+    # offline: metrics go to each trial's metrics.jsonl, which is also where the sweep reads val f1
+    train_argv = to_argv(space.get("fixed", {})) + train_argv
+    train_argv += ["--logger", "jsonl", "--state_interval", "0", "--defer_render", "true"]
+
+    train_parser = argparse.ArgumentParser(add_help=False)
+    train_parser.add_argument("--file_dir", type=str, default="")
+    train_parser.add_argument(
+        "--data_dir", type=str, default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train/images")
+    )
+    train_parser.add_argument("--new_dataset", type=bool, default=False)
+    train_parser.add_argument("--resize", nargs=2, type=int, default=(512, 384))
+    train_parser.add_argument("--shard_dir", type=str, default="")
+    train_args, _ = train_parser.parse_known_args(train_argv)
+    if args.cache_dir and not train_args.shard_dir:
+        resizes = {tuple(trial.get("resize", train_args.resize)) for trial in trials}
+        build_caches(train_args, sorted(resizes), args.cache_dir)
+        train_argv += ["--cache_dir", args.cache_dir]
+
+    num_gpus = gpu_count()
+    sweep = Sweep(
+        args.sweep_dir,
+        trials,
+        train_argv,
+        rungs(args.min_epochs, args.max_epochs, args.eta),
+        eta=args.eta,
+        # one trial per GPU, otherwise one per 4 CPU cores
+        max_parallel=args.max_parallel or num_gpus or max(1, (os.cpu_count() or 1) // 4),
+        num_gpus=num_gpus,
+    )
+    print(f"{len(trials)} trials, rungs {sweep.rungs} epochs, {sweep.max_parallel} in parallel")
+
+    rows = sweep.run()
+    print(f"\n{'rank':<5}{'trial':<11}{'status':<13}{'epochs':>6}{'best_f1':>9}  params")
+    for row in rows:
+        best_f1 = "-" if row["best_f1"] is None else f"{row['best_f1']:.4f}"
+        params = " ".join(f"{name}={row[name]}" for name in trials[0])
+        print(
+            f"{row['rank']:<5}{row['trial']:<11}{row['status']:<13}{row['epochs']:>6}{best_f1:>9}  {params}"
+        )
+    print(f"Leaderboard saved to {os.path.join(args.sweep_dir, LEADERBOARD_FILE)}")
@@ -1,38 +1,60 @@
 import argparse
 import json
-import multiprocessing
 import os
 from importlib import import_module
 
 import torch
 from torch.optim.lr_scheduler import StepLR
-from torch.utils.data import DataLoader
-from sklearn.metrics import f1_score
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, RandomSampler
 
 import numpy as np
 from tqdm import tqdm
 
-from loss import get_criterion
+from checkpoint import STATE_FILE, CheckpointManager, find_state, rng_state, set_rng_state
+from loss import MultiTaskLoss, get_criterion
+from metrics import ConfusionMatrix
+from profiler import StepTimer, build_profiler
 import settings
 import logger
 
-import wandb
-
 
 def train(helper):
     args = helper.args
     device = helper.device
-    is_cuda = helper.device == torch.device("cuda")
+    is_cuda = helper.device.type == "cuda"
+
+    assert not (args.shard_dir and args.cache_dir), "--shard_dir 와 --cache_dir 는 함께 사용할 수 없습니다"
 
+    # rank 0 builds the metadata, image and statistics caches first, the other ranks then load them
+    if not helper.is_main:
+        helper.barrier()
     DataInfo = getattr(import_module("dataset"), "TrainInfo")
-    data_info = DataInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset)
+    if args.shard_dir:  # shard index holds the metadata, images are read from the shards
+        data_info = DataInfo(file_dir=os.path.join(args.shard_dir, "index.csv"), new_dataset=True)
+    else:
+        data_info = DataInfo(file_dir=args.file_dir, data_dir=args.data_dir, new_dataset=args.new_dataset)
     train_df, valid_df, dist_df = data_info.split_dataset(args.val_ratio)
+    cache = None
+    if args.cache_dir:
+        ImageCache = getattr(import_module("cache"), "ImageCache")
+        cache = ImageCache.from_info(data_info, args.cache_dir, args.resize).load_or_build()
 
     mean = (0.56019358, 0.52410121, 0.501457)
     std = (0.23318603, 0.24300033, 0.24567522)
+    if args.calc_stats:
+        mean, std = data_info.calc_statistics(sample_size=args.stats_sample)
+    if helper.is_main:
+        helper.barrier()
     Dataset = getattr(import_module("dataset"), args.dataset)
-    train_set = Dataset(train_df, mean=mean, std=std, label_col="Class" + args.mode.capitalize())
-    valid_set = Dataset(valid_df, mean=mean, std=std, label_col="Class" + args.mode.capitalize())
+    # multitask mode learns every head from the combined 18-class label
+    label_col = "Class" if args.mode == "multitask" else "Class" + args.mode.capitalize()
+    dataset_kwargs = dict(mean=mean, std=std, label_col=label_col, cache=cache)
+    if args.shard_dir:
+        Dataset = getattr(import_module("dataset"), "ShardDataset")
+        dataset_kwargs["shard_dir"] = args.shard_dir
+    train_set = Dataset(train_df, **dataset_kwargs)
+    valid_set = Dataset(valid_df, **dataset_kwargs)
     num_classes = valid_set.num_classes
 
     Transforms = list(map(lambda trf: getattr(import_module("transform"), trf), args.transform))
@@ -48,28 +70,61 @@ def train(helper):
     )
     train_set.set_transform(train_transform)
     valid_set.set_transform(val_transform)
+    # Batch-level transforms run on collated batches in this process (see transform.BatchBaseTransform)
+    train_batch_transform = getattr(train_transform, "batch_transform", None)
+    val_batch_transform = getattr(val_transform, "batch_transform", None)
+    if train_batch_transform is not None:
+        train_batch_transform = train_batch_transform.to(device)
+    if val_batch_transform is not None:
+        val_batch_transform = val_batch_transform.to(device)
+    valid_sampler = None
+    if helper.is_distributed:
+        # each process trains on its own shard of the split and validates on every world_size-th sample
+        train_sampler = DistributedSampler(train_set, seed=args.seed, drop_last=True)
+        valid_sampler = list(range(helper.rank, len(valid_set), helper.world_size))
+    elif args.shard_dir:
+        train_sampler = getattr(import_module("dataset"), "ShardSampler")(train_set.shard_ids)
+    else:
+        train_sampler = RandomSampler(train_set)
+    # batch order depends only on (seed, epoch), so --resume can continue in the middle of an epoch
+    train_sampler = getattr(import_module("dataset"), "ResumableSampler")(train_sampler, seed=args.seed)
+    steps_per_epoch = len(train_sampler) // args.batch_size
     train_loader = DataLoader(
         train_set,
         batch_size=args.batch_size,
-        num_workers=multiprocessing.cpu_count(),
-        shuffle=True,
+        num_workers=helper.num_workers(),
+        sampler=train_sampler,
         pin_memory=is_cuda,
         drop_last=True,
+        generator=torch.Generator(),  # worker seeds, reseeded every epoch
     )
 
     valid_loader = DataLoader(
         valid_set,
         batch_size=args.batch_size,
-        num_workers=multiprocessing.cpu_count(),
+        num_workers=helper.num_workers(),
         shuffle=False,
+        sampler=valid_sampler,
         pin_memory=is_cuda,
         drop_last=True,
     )
 
     Model = getattr(import_module("model"), args.model)
-    model = Model(num_classes=num_classes, freeze=args.freeze).to(device)
-    model = torch.nn.DataParallel(model)
-    criterion = get_criterion(args.criterion)
+    if args.mode == "multitask":
+        assert hasattr(
+            Model, "predict"
+        ), "--mode multitask 는 MultiTaskResNet18 같은 multi-head model 이 필요합니다"
+    predict = getattr(Model, "predict", lambda outs: torch.argmax(outs, dim=1))
+    memory_format = getattr(torch, args.memory_format)
+    model = Model(num_classes=num_classes, freeze=args.freeze).to(device, memory_format=memory_format)
+    if helper.is_distributed:
+        model = DistributedDataParallel(model, device_ids=[device.index] if is_cuda else None)
+    else:
+        model = torch.nn.DataParallel(model)
+    if args.mode == "multitask":
+        criterion = MultiTaskLoss(args.criterion)
+    else:
+        criterion = get_criterion(args.criterion)
     Optimizer = getattr(import_module("torch.optim"), args.optimizer)
     optimizer = Optimizer(
         filter(lambda p: p.requires_grad, model.parameters()),
@@ -77,16 +132,95 @@ def train(helper):
         weight_decay=5e-4,
     )
     scheduler = StepLR(optimizer, args.lr_decay_step, gamma=0.5)
-    save_dir = helper.get_save_dir(dump=args.dump)
-    os.makedirs(save_dir, exist_ok=True)
-    with open(os.path.join(save_dir, f"{args.mode}.json"), "w", encoding="utf-8") as f:
-        json.dump(vars(args), f, ensure_ascii=False, indent=4)
+    autocast = settings.get_autocast(device, args.precision)
+    scaler = settings.get_grad_scaler(device, args.precision)
+    save_dir, state_path, state = None, None, None
+    if helper.is_main:
+        save_dir = helper.get_save_dir(dump=args.dump)
+        if args.resume:
+            state_path, state = find_state(helper.resume_candidates(STATE_FILE))
+            if state is None:
+                print(f"No training state in {helper.get_save_dir(dump=True)}*, training from scratch")
+            else:
+                save_dir = os.path.dirname(state_path)
+                print(f"Resuming from {state_path} (epoch {state['epoch']}, step {state['step']})")
+    # every rank uses the save directory and training state rank 0 picked
+    save_dir, state_path = helper.broadcast_object((save_dir, state_path))
+    if state_path is not None and state is None:
+        _, state = find_state([state_path])
+    if helper.is_main:
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, f"{args.mode}.json"), "w", encoding="utf-8") as f:
+            json.dump(vars(args), f, ensure_ascii=False, indent=4)
+    # metrics go to W&B / local files on a background thread (only the main process logs)
+    if helper.is_main:
+        run_logger = logger.build_logger(args.logger, save_dir, config=vars(args), wandb_mode=args.wandb_mode)
+    else:
+        run_logger = logger.NoopLogger()
+
+    if helper.is_main:
+        checkpoints = CheckpointManager(
+            save_dir,
+            args.model,
+            num_classes,
+            half=args.save_half,
+            top_k=args.save_top_k,
+            top_k_metric=args.top_k_metric,
+            prefix=args.mode if args.mode else args.model_name,
+            # normalization of training, read back by export.py / quantize.py
+            preprocess=dict(
+                resize=list(args.resize),
+                mean=[float(value) for value in train_set.mean],
+                std=[float(value) for value in train_set.std],
+            ),
+        )
+        # raw counts go to npz immediately, PNGs are rendered on a background thread
+        matrices = logger.ConfusionMatrixWriter(render=not args.defer_render)
+
+    # per-stage step timing(--step_timing) and a torch.profiler window(--profile_steps)
+    timer = StepTimer(
+        enabled=args.step_timing,
+        device=device,
+        log_path=os.path.join(save_dir, "timing.jsonl") if helper.is_main else None,
+    )
+    profiler = build_profiler(args.profile_steps if helper.is_main else None, save_dir)
+    profiler.start()
 
     best_val_acc = 0
     best_val_loss = np.inf
     best_f1 = 0
-
-    for epoch in range(1, args.epochs + 1):
+    start_epoch, start_step = 1, 0
+
+    def train_state(epoch, step, loss_value=None, train_matrix=None):
+        """Everything needed to continue training from `step` batches into `epoch`."""
+        return dict(
+            epoch=epoch,
+            step=step,
+            model=model.module.state_dict(),
+            optimizer=optimizer.state_dict(),
+            scheduler=scheduler.state_dict(),
+            scaler=scaler.state_dict(),
+            best_val_acc=best_val_acc,
+            best_val_loss=best_val_loss,
+            best_f1=best_f1,
+            loss_value=loss_value,
+            train_matrix=train_matrix,
+            rng=rng_state(),
+            args=vars(args),
+        )
+
+    if state is not None:
+        model.module.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        scaler.load_state_dict(state["scaler"])
+        start_epoch, start_step = state["epoch"], state["step"]
+        best_val_acc, best_val_loss, best_f1 = state["best_val_acc"], state["best_val_loss"], state["best_f1"]
+        if helper.is_main:
+            checkpoints.load_state(state)
+        set_rng_state(state["rng"])
+
+    for epoch in range(start_epoch, args.epochs + 1):
         """
         Start training
         - For each epoch, when training is done, execute evaluation with validation set.
@@ -95,56 +229,86 @@ def train(helper):
         - Prints each performace of train/validation
         - W&B is used to share process and results to all team members.
         """
-        loss_value = 0
-        matches = 0
-        accumulated_f1 = 0
-        iter_count = 0
-
-        for idx, (imgs, labels) in enumerate(train_loader):
-            imgs = imgs.to(device)
-            labels = labels.to(device)
-
-            if args.cutmix:  # cutmix
-                Cutmix = getattr(import_module("transform"), "Cutmix")
-                cutmix = Cutmix(model, criterion, 1, imgs, labels, device)
-                loss, preds = cutmix.start_cutmix()
-            else:  # standard
-                outs = model(imgs)
-                preds = torch.argmax(outs, dim=1)
-                loss = criterion(outs, labels)
+        loss_value = torch.zeros((), device=device)
+        train_metrics = ConfusionMatrix(num_classes, device=device)
+        # a resumed epoch skips the batches trained before the state was saved
+        skip = start_step if epoch == start_epoch else 0
+        train_sampler.set_epoch(epoch, start=skip * args.batch_size)
+        train_loader.generator.manual_seed(args.seed + epoch)
+        if skip and state["loss_value"] is not None:
+            loss_value.copy_(state["loss_value"])
+            train_metrics.matrix.copy_(state["train_matrix"])
+
+        timer.start()
+        for idx, (imgs, labels) in enumerate(train_loader, start=skip):
+            timer.lap("data")
+            imgs = imgs.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            if train_batch_transform is not None:
+                imgs = train_batch_transform(imgs)
+            imgs = imgs.contiguous(memory_format=memory_format)
+            timer.lap("h2d")
+
+            with autocast():
+                if args.cutmix:  # cutmix
+                    Cutmix = getattr(import_module("transform"), "Cutmix")
+                    cutmix = Cutmix(model, criterion, 1, imgs, labels, device, predict=predict)
+                    loss, preds = cutmix.start_cutmix()
+                else:  # standard
+                    outs = model(imgs)
+                    preds = predict(outs)
+                    loss = criterion(outs, labels)
+            timer.lap("forward")
 
             optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-
-            loss_value += loss.item()
-            matches += (preds == labels).float().mean().item()
-            accumulated_f1 += f1_score(labels.cpu().numpy(), preds.cpu().numpy(), average="macro")
-            iter_count += 1
+            scaler.scale(loss).backward()
+            timer.lap("backward")
+            scaler.step(optimizer)
+            scaler.update()
+            timer.lap("optimizer")
+
+            # Metrics stay on the device, host syncs only at log intervals
+            loss_value += loss.detach()
+            train_metrics.update(labels, preds)
+            timer.lap("metrics")
+            profiler.step()
 
             # Execute logging
             if (idx + 1) % args.log_interval == 0:
-                train_loss = loss_value / args.log_interval
-                train_acc = matches / args.log_interval
-                train_f1 = accumulated_f1 / iter_count
+                helper.all_reduce(train_metrics.matrix)
+                helper.all_reduce(loss_value)
+                train_result = train_metrics.compute()
+                train_loss = loss_value.item() / (args.log_interval * helper.world_size)
+                train_acc = train_result["accuracy"]
+                train_f1 = train_result["f1"]
                 current_lr = logger.get_lr(optimizer)
-
-                # print train loss
-                print(
-                    f"Epoch: {epoch:0{len(str(args.epochs))}d}/{args.epochs} "
-                    f"[{idx + 1:0{len(str(len(train_loader)))}d}/{len(train_loader)}]\n"
-                    f"training accuracy: {train_acc:>3.2%}\ttraining loss: {train_loss:>4.4f}\ttraining f1: {train_f1:>4.4f}\tlearning rate: {current_lr}\n"
-                )
-                # Save logs at W&B
-                wandb.log(
-                    {
-                        "Train/loss": train_loss,
-                        "Train/accuracy": train_acc,
-                        "Train/f1": train_f1,
-                    }
-                )
-                loss_value = 0
-                matches = 0
+                timing = timer.summary()
+
+                if helper.is_main:
+                    # print train loss
+                    print(
+                        f"Epoch: {epoch:0{len(str(args.epochs))}d}/{args.epochs} "
+                        f"[{idx + 1:0{len(str(steps_per_epoch))}d}/{steps_per_epoch}]\n"
+                        f"training accuracy: {train_acc:>3.2%}\ttraining loss: {train_loss:>4.4f}\ttraining f1: {train_f1:>4.4f}\tlearning rate: {current_lr}\n"
+                    )
+                    # Save logs at W&B
+                    run_logger.log(
+                        {
+                            "Train/loss": train_loss,
+                            "Train/accuracy": train_acc,
+                            "Train/f1": train_f1,
+                            **timing,
+                        }
+                    )
+                    timer.log(timing, epoch=epoch, step=idx + 1)
+                loss_value.zero_()
+                train_metrics.reset()
+                timer.start()  # logging time is not charged to the next data wait
+
+            # full training state every --state_interval steps, written in the background
+            if helper.is_main and args.state_interval and (idx + 1) % args.state_interval == 0:
+                checkpoints.save_state(train_state(epoch, idx + 1, loss_value, train_metrics.matrix))
+                timer.start()
 
         # Step scheduler
         scheduler.step()
@@ -152,78 +316,86 @@ def train(helper):
         # Change to evaluation mode
         model.eval()
         with torch.no_grad():
-            val_loss_items = []
-            val_acc_items = []
-            val_f1_items = []
-
-            val_labels = []
-            val_preds = []
-            for val_batch in tqdm(valid_loader, colour="GREEN"):
+            val_loss_sum = torch.zeros((), device=device)
+            val_metrics = ConfusionMatrix(num_classes, device=device)
+            for val_batch in tqdm(valid_loader, colour="GREEN", disable=not helper.is_main):
                 inputs, labels = val_batch
-                val_labels.extend(map(torch.Tensor.item, labels))
-
-                inputs = inputs.to(device)
-                labels = labels.to(device)
-
-                outs = model(inputs)
-                preds = torch.argmax(outs, dim=-1)
-                val_preds.extend(map(torch.Tensor.item, preds))
-
-                loss_item = criterion(outs, labels).item()
-                acc_item = (labels == preds).float().sum().item()
-                f1_item = f1_score(labels.cpu().numpy(), preds.cpu().numpy(), average="macro")
-                val_loss_items.append(loss_item)
-                val_acc_items.append(acc_item)
-                val_f1_items.append(f1_item)
 
-            val_loss = np.sum(val_loss_items) / len(valid_loader)
-            val_acc = np.sum(val_acc_items) / len(valid_set)
-            val_f1 = np.average(val_f1_items)
+                inputs = inputs.to(device, non_blocking=True)
+                labels = labels.to(device, non_blocking=True)
+                if val_batch_transform is not None:
+                    inputs = val_batch_transform(inputs)
+                inputs = inputs.contiguous(memory_format=memory_format)
+
+                with autocast():
+                    outs = model(inputs)
+                    preds = predict(outs)
+                    val_loss_sum += criterion(outs, labels).float()
+                val_metrics.update(labels, preds)
+
+            # all-reduce loss sum, batch count and confusion matrix across processes
+            val_batches = helper.all_reduce(torch.tensor(float(len(valid_loader)), device=device))
+            helper.all_reduce(val_loss_sum)
+            helper.all_reduce(val_metrics.matrix)
+            val_result = val_metrics.compute()
+            val_matrix = val_metrics.numpy()
+            val_loss = val_loss_sum.item() / val_batches.item()
+            val_acc = val_result["accuracy"]
+            val_f1 = val_result["f1"]
             best_val_loss = min(best_val_loss, val_loss)
 
-            # If current accuracy is higher than previous ones than print&update results
-            if val_acc > best_val_acc:
-                print(f"New best model for val accuracy : {val_acc:3.2%}! saving the best model..")
-                torch.save(
-                    model,
-                    os.path.join(save_dir, f"{args.mode if args.mode else args.model_name}.pt"),
-                )
-                best_val_acc = val_acc
-                logger.save_confusion_matrix(
-                    num_classes=valid_set.num_classes,
-                    labels=val_labels,
-                    preds=val_preds,
-                    save_path=os.path.join(
-                        save_dir,
-                        f"acc_{args.mode if args.mode else args.model_name}_confusion_matrix.png",
-                    ),
-                )
-            # If current f1_score is higher than previous ones than print&update results
-            if val_f1 > best_f1:
-                print(f"New best model for f1 : {val_f1:3.2f}! saving the best model..")
-                torch.save(
-                    model,
-                    os.path.join(save_dir, f"{args.mode if args.mode else args.model_name}f1.pt"),
+            # Only the main process saves models, confusion matrices and logs
+            if helper.is_main:
+                best_names = []
+                # If current accuracy is higher than previous ones than print&update results
+                if val_acc > best_val_acc:
+                    print(f"New best model for val accuracy : {val_acc:3.2%}! saving the best model..")
+                    best_names.append(f"{args.mode if args.mode else args.model_name}.pt")
+                    best_val_acc = val_acc
+                    matrices.save(
+                        val_matrix,
+                        save_path=os.path.join(
+                            save_dir,
+                            f"acc_{args.mode if args.mode else args.model_name}_confusion_matrix",
+                        ),
+                        epoch=epoch,
+                        accuracy=val_acc,
+                        f1=val_f1,
+                    )
+                # If current f1_score is higher than previous ones than print&update results
+                if val_f1 > best_f1:
+                    print(f"New best model for f1 : {val_f1:3.2f}! saving the best model..")
+                    best_names.append(f"{args.mode if args.mode else args.model_name}f1.pt")
+                    best_f1 = val_f1
+                    matrices.save(
+                        val_matrix,
+                        save_path=os.path.join(
+                            save_dir,
+                            f"f1_{args.mode if args.mode else args.model_name}_confusion_matrix",
+                        ),
+                        epoch=epoch,
+                        accuracy=val_acc,
+                        f1=val_f1,
+                    )
+                # one snapshot per epoch, written in the background (see checkpoint.CheckpointManager)
+                checkpoints.save(model, best_names, epoch, dict(accuracy=val_acc, f1=val_f1, loss=val_loss))
+                # Print perfomance of validation set
+                print(
+                    f"Validation:\n"
+                    f"accuracy: {val_acc:>3.2%}\tloss: {val_loss:>4.2f}\tf1: {val_f1:>4.2f}\n"
+                    f"best acc : {best_val_acc:>3.2%}\tbest loss: {best_val_loss:>4.2f}\tbest f1: {best_f1:>3.2f}\n"
                 )
-                best_f1 = val_f1
-                logger.save_confusion_matrix(
-                    num_classes=valid_set.num_classes,
-                    labels=val_labels,
-                    preds=val_preds,
-                    save_path=os.path.join(
-                        save_dir,
-                        f"f1_{args.mode if args.mode else args.model_name}_confusion_matrix.png",
-                    ),
+                # Save log at W&B
+                run_logger.log(
+                    {"Val/loss": val_loss, "Val/accuracy": val_acc, "Val/f1": val_f1, "epoch": epoch}
                 )
-            # Print perfomance of validation set
-            print(
-                f"Validation:\n"
-                f"accuracy: {val_acc:>3.2%}\tloss: {val_loss:>4.2f}\tf1: {val_f1:>4.2f}\n"
-                f"best acc : {best_val_acc:>3.2%}\tbest loss: {best_val_loss:>4.2f}\tbest f1: {best_f1:>3.2f}\n"
-            )
-            # Save log at W&B
-            wandb.log({"Val/loss": val_loss, "Val/accuracy": val_acc, "Val/f1": val_f1})
+                checkpoints.save_state(train_state(epoch + 1, 0))
         model.train()
+    profiler.stop()
+    run_logger.close()
+    if helper.is_main:
+        checkpoints.close()
+        matrices.close()
 
 
 if __name__ == "__main__":
@@ -236,7 +408,38 @@ if __name__ == "__main__":
     parser.add_argument("--model_dir", type=str, default=os.environ.get("SM_MODEL_DIR", "./model"))
     parser.add_argument("--file_dir", type=str, default="")
     parser.add_argument("--new_dataset", type=bool, default=False)
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="",
+        help="pre-decoded image cache directory, not with --shard_dir (default: disabled)",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default="",
+        help="read images from shards packed by shard.py (default: disabled)",
+    )
+    parser.add_argument(
+        "--calc_stats", type=bool, default=False, help="calculate (cached) mean & std of the metadata images"
+    )
+    parser.add_argument(
+        "--stats_sample", type=int, default=0, help="subsample size for --calc_stats (default: 0, all images)"
+    )
     parser.add_argument("--seed", type=int, default=42, help="random seed (default: 42)")
+    parser.add_argument(
+        "--step_timing",
+        type=bool,
+        default=False,
+        help="log per-stage step time percentiles to wandb and {save_dir}/timing.jsonl",
+    )
+    parser.add_argument(
+        "--profile_steps",
+        nargs=2,
+        type=int,
+        default=None,
+        help="capture a torch.profiler trace of training steps FIRST..LAST into {save_dir}/profiler",
+    )
     parser.add_argument("--epochs", type=int, default=5, help="number of epochs to train (default: 5)")
     parser.add_argument(
         "--dataset",
@@ -246,14 +449,16 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--transform",
+        nargs=2,
         type=str,
         default=("BaseTransform", "CustomTransform"),
-        help='data transform type (default: ("BaseTransform", "CustomTransform"))',
+        help='validation and train transform types (default: ("BaseTransform", "CustomTransform")), '
+        'use ("BatchBaseTransform", "BatchCustomTransform") to run normalize/augmentation per batch',
     )
     parser.add_argument(
         "--resize",
-        nargs="+",
-        type=list,
+        nargs=2,
+        type=int,
         default=(512, 384),
         help="resize size for image when training (default: (512, 384))",
     )
@@ -263,6 +468,12 @@ if __name__ == "__main__":
         default=64,
         help="input batch size for training (default: 64)",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="DataLoader workers per process, 0 for exact --resume (default: cpu count / processes per node)",
+    )
     parser.add_argument(
         "--val_batch_size",
         type=int,
@@ -302,30 +513,84 @@ if __name__ == "__main__":
         help="how many batches to wait before logging training status",
     )
     parser.add_argument("--name", type=str, default="exp", help="model to save at {SM_MODEL_DIR}/{name}")
-    parser.add_argument("--mode", type=str, default="", help="select mask, age, gender, ensemble")
+    parser.add_argument("--mode", type=str, default="", help="select mask, age, gender, multitask")
     parser.add_argument("--model_name", type=str, default="best", help="custom model name")
     parser.add_argument("--freeze", nargs="+", default=[], help="layers to freeze (default: [])")
     parser.add_argument("--dump", type=bool, default=False, help="choose dump or not to save model")
+    parser.add_argument(
+        "--save_half", type=bool, default=False, help="store checkpoint weights in float16 (default: False)"
+    )
+    parser.add_argument(
+        "--save_top_k",
+        type=int,
+        default=0,
+        help="also keep the k best epochs as {mode}_epoch{N}.pt (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--top_k_metric",
+        type=str,
+        default="f1",
+        choices=["f1", "accuracy"],
+        help="validation metric ranking --save_top_k checkpoints (default: f1)",
+    )
+    parser.add_argument(
+        "--resume",
+        type=bool,
+        default=False,
+        help="continue from the newest valid state.pt in {model_dir}/{name}* (default: False)",
+    )
+    parser.add_argument(
+        "--state_interval",
+        type=int,
+        default=200,
+        help="steps between full training states for --resume, 0 saves only at epoch ends (default: 200)",
+    )
+    parser.add_argument(
+        "--defer_render",
+        type=bool,
+        default=False,
+        help="save confusion matrices only as npz counts, render later with `python logger.py {save_dir}`",
+    )
 
     parser.add_argument("--cutmix", type=bool, default=False, help="choose whether to use cutmix or not")
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="fp32",
+        choices=["fp32", "bf16", "fp16"],
+        help="autocast precision for forward and loss (default: fp32)",
+    )
+    parser.add_argument(
+        "--memory_format",
+        type=str,
+        default="contiguous_format",
+        choices=["contiguous_format", "channels_last"],
+        help="memory format of model weights and input batches (default: contiguous_format)",
+    )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--logger",
+        nargs="+",
+        default=["wandb", "jsonl"],
+        choices=logger.LOGGER_BACKENDS,
+        help="metric logging backends, jsonl/csv write to the save dir (default: wandb jsonl)",
+    )
+    parser.add_argument(
+        "--wandb_mode",
+        type=str,
+        default=os.environ.get("WANDB_MODE", "online"),
+        choices=["online", "offline", "disabled"],
+        help="offline runs are saved under ./wandb, upload them later with `wandb sync` (default: online)",
+    )
 
-    """
-    Initalize W&B
-    """
-    wandb_file = json.load(open("wandb_setting/wandb_config.json"))
-    project, entity, name = wandb_file["init"].values()
-    wandb.init(project=project, entity=entity, name=name, config=args)
-    print(args)
+    args = parser.parse_args()
 
     helper = settings.SettingsHelper(
         args=args, device=torch.device("cuda" if torch.cuda.is_available() else "cpu")
     )
 
-    with open("wandb_setting/wandb_config.json", "r") as f:
-        wb_object = json.load(f)
-        project, entity, name = wb_object["init"].values()
-        wandb.init(project=project, entity=entity, config=args)
+    if helper.is_main:
+        print(args)
 
     train(helper=helper)
+    helper.cleanup()
@@ -1,5 +1,7 @@
 import numpy as np
 import torch
+import torch.nn as nn
+from PIL import Image
 from torchvision import transforms as T
 
 
@@ -41,6 +43,188 @@ class CustomTransform(BaseTransform):
         self.transforms = [*self.transforms, T.RandomHorizontalFlip(p=0.5)]
 
 
+class FastBaseTransform:
+    """
+    Drop-in replacement of BaseTransform with the same [Resize, ToTensor, Normalize] steps.
+    - JPEGs are decoded with DCT scaling(PIL draft mode) at the smallest scale that is still at least `resize`
+    - Resize, to-tensor and normalize are fused into one output buffer
+
+    Args:
+        resize (sequence): Size that an image is resized to
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+    """
+
+    def __init__(self, resize, mean, std):
+        self.height, self.width = resize
+        mean = torch.tensor(mean, dtype=torch.float32).view(-1, 1, 1)
+        std = torch.tensor(std, dtype=torch.float32).view(-1, 1, 1)
+        self.scale = 1 / (255 * std)
+        self.shift = mean / std
+
+    def resize(self, image):
+        if image.format == "JPEG":
+            image.draft("RGB", (self.width, self.height))
+        return image.convert("RGB").resize((self.width, self.height), Image.BICUBIC)
+
+    def to_tensor(self, image):
+        pixels = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+        tensor = torch.empty(pixels.shape, dtype=torch.float32)
+        tensor.copy_(pixels)
+        return tensor.mul_(self.scale).sub_(self.shift)
+
+    def __call__(self, image):
+        return self.to_tensor(self.resize(image))
+
+
+class FastCustomTransform(FastBaseTransform):
+    """
+    Drop-in replacement of CustomTransform.
+    It contains [FastBaseTransform, RandomHorizontalFlip(p=0.5)] by default.
+
+    Args:
+        resize (sequence): Size that an image is resized to
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+    """
+
+    def __init__(self, resize, mean, std, p=0.5):
+        super().__init__(resize=resize, mean=mean, std=std)
+        self.p = p
+
+    def __call__(self, image):
+        image = self.resize(image)
+        if torch.rand(1) < self.p:
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+        return self.to_tensor(image)
+
+
+class BatchNormalize(nn.Module):
+    """
+    Converts a uint8 image batch to float and normalizes it on the batch's device.
+
+    Args:
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+    """
+
+    def __init__(self, mean, std):
+        super().__init__()
+        self.register_buffer("mean", torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1) * 255)
+        self.register_buffer("std", torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1) * 255)
+
+    def forward(self, images):
+        return (images.float() - self.mean) / self.std
+
+
+class BatchRandomHorizontalFlip(nn.Module):
+    """
+    Horizontally flips each image of a batch with probability p.
+
+    Args:
+        p (float): Probability of flipping an image
+    """
+
+    def __init__(self, p=0.5):
+        super().__init__()
+        self.p = p
+
+    def forward(self, images):
+        flip = torch.rand(images.size(0), device=images.device) < self.p
+        return torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+
+class BatchTTA(nn.Module):
+    """
+    Test-time augmentation on an already decoded batch.
+    `forward` stacks the views of every image into one (views * N) batch so a single forward pass
+    scores them all, and `merge` averages the per-view scores back to N.
+    A view is (scale, dy, dx, flip): a crop of `scale` of the image, shifted by (dy, dx) of the free
+    margin(-1 ~ 1), resized back to the input size and optionally flipped horizontally.
+
+    Args:
+        views (str): View set name in `BatchTTA.view_sets`
+    """
+
+    view_sets = {
+        "none": [(1.0, 0, 0, False)],
+        "flip": [(1.0, 0, 0, False), (1.0, 0, 0, True)],
+        "scale": [(1.0, 0, 0, False), (1.0, 0, 0, True), (0.9, 0, 0, False), (0.9, 0, 0, True)],
+        "shift": [
+            (1.0, 0, 0, False),
+            (1.0, 0, 0, True),
+            (0.9, 0, 0, False),
+            (0.9, -1, -1, False),
+            (0.9, -1, 1, False),
+            (0.9, 1, -1, False),
+            (0.9, 1, 1, False),
+        ],
+    }
+
+    def __init__(self, views="flip"):
+        super().__init__()
+        self.views = self.view_sets[views]
+
+    def __len__(self):
+        return len(self.views)
+
+    def view(self, images, scale, dy, dx, flip):
+        height, width = images.shape[-2:]
+        if scale < 1:
+            crop_h, crop_w = round(height * scale), round(width * scale)
+            top = round((height - crop_h) * (dy + 1) / 2)
+            left = round((width - crop_w) * (dx + 1) / 2)
+            crop = images[..., top : top + crop_h, left : left + crop_w].float()
+            crop = nn.functional.interpolate(crop, size=(height, width), mode="bilinear", align_corners=False)
+            images = crop if images.is_floating_point() else crop.round().to(images.dtype)
+        return images.flip(-1) if flip else images
+
+    def forward(self, images):
+        if self.views == self.view_sets["none"]:
+            return images
+        return torch.cat([self.view(images, *view) for view in self.views])
+
+    def merge(self, scores):
+        return scores.view(len(self.views), -1, *scores.shape[1:]).mean(dim=0)
+
+
+class BatchBaseTransform:
+    """
+    Batch-level counterpart of BaseTransform.
+    Workers only resize and return uint8 tensors [Resize, PILToTensor], which cuts DataLoader IPC
+    volume by 4x. `batch_transform` [BatchNormalize] then runs on the collated batch in the
+    training process.
+
+    Args:
+        resize (sequence): Size that an image is resized to
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+    """
+
+    def __init__(self, resize, mean, std):
+        self.transforms = T.Compose([T.Resize(resize, T.InterpolationMode.BICUBIC), T.PILToTensor()])
+        self.batch_transform = nn.Sequential(BatchNormalize(mean=mean, std=std))
+
+    def __call__(self, image):
+        return self.transforms(image)
+
+
+class BatchCustomTransform(BatchBaseTransform):
+    """
+    Batch-level counterpart of CustomTransform.
+    `batch_transform` contains [BatchRandomHorizontalFlip(p=0.5), BatchNormalize] by default.
+
+    Args:
+        resize (sequence): Size that an image is resized to
+        mean (sequence): Sequence of means for each channel
+        std (sequence): Sequence of standard deviations for each channel
+    """
+
+    def __init__(self, resize, mean, std):
+        super().__init__(resize=resize, mean=mean, std=std)
+        self.batch_transform = nn.Sequential(BatchRandomHorizontalFlip(p=0.5), *self.batch_transform)
+
+
 class Cutmix:
     """
     Applies Cutmix transformation for each generated batch
@@ -51,15 +235,17 @@ class Cutmix:
         beta: beta value of Beta distribution
         images: incoming images with tensor format
         labels: labels that corresponds with images
+        predict: function that turns model outputs into predicted labels (default: argmax)
     """
 
-    def __init__(self, model, criterion, beta, images, labels, device):
+    def __init__(self, model, criterion, beta, images, labels, device, predict=None):
         self.model = model
         self.criterion = criterion
         self.beta = beta
         self.images = images
         self.labels = labels
         self.device = device
+        self.predict = predict or (lambda outputs: torch.argmax(outputs, dim=1))
         self.loss = None
         self.preds = None
         self.matches = None
@@ -94,7 +280,7 @@ class Cutmix:
             outputs = self.model(self.images)
             self.loss = self.criterion(outputs, self.labels)
 
-        self.preds = torch.argmax(outputs, dim=1)
+        self.preds = self.predict(outputs)
 
         return (
             self.loss,
@@ -117,8 +303,8 @@ class Cutmix:
         H = size[3]
 
         cut_rat = np.sqrt(1.0 - lam)  # get ratio
-        cut_w = np.int(W * cut_rat)
-        cut_h = np.int(H * cut_rat)
+        cut_w = int(W * cut_rat)
+        cut_h = int(H * cut_rat)
 
         # Center coordinate values
         cx = np.random.randint(W)
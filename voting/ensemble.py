@@ -1,57 +1,188 @@
 # System Libs.
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Other Libs
+import numpy as np
 import pandas as pd
 
+SCORE_KINDS = ("logits", "probs")
 
-def ensemble_preds(pred_folder_path, save_path, weights=None, return_result=False):
+
+def list_preds(pred_folder_path, exclude=None):
     """
-    Save and get voting result from predictions.
+    Prediction csv files in a folder, sorted by name so weights and tie-breaking are deterministic.
+    Files starting with '_' are skipped.
 
     Args:
-        pred_folder_path (list): Folder directory contains pred csv files.
-        save_path (str or pathlib.Path): Voting result save path.
-        weights (sequence): Weight for each prediction. Defaults to None.
-        return_result (bool): Wheter return voting result.
+        pred_folder_path (str or pathlib.Path): Folder directory contains pred csv files.
+        exclude (str or pathlib.Path, optional): File to leave out(e.g. a previous voting result). Defaults to None.
 
     Returns:
-        ensemble_result(pd.DataFrame): Voting result.
+        pred_list (list): Prediction csv paths.
     """
+    pred_folder_path = Path(pred_folder_path)
+    exclude = Path(exclude).resolve() if exclude else None
+    return [
+        pred_folder_path.joinpath(f)
+        for f in sorted(os.listdir(pred_folder_path))
+        if f.endswith(".csv") and not f.startswith("_") and pred_folder_path.joinpath(f).resolve() != exclude
+    ]
 
-    def _voting(voting):
-        """
-        Get voting result with voting weights.
 
-        Args:
-            voting (pd.Series): Vote for each prediction.
+def read_preds(pred_list, num_workers=8):
+    """
+    Read prediction csv files in parallel into an (n_models, n_rows) int array.
+    Every file is aligned on the image ids of the first file, so re-sorted files still vote per image.
 
-        Returns:
-            result (int): Voting result.
-        """
-        result_dict = {pred_value: 0 for pred_value in voting.unique()}
-        for vote, weight in zip(voting, weights):
-            result_dict[vote] += weight
-        result = max(result_dict, key=result_dict.get)
-        return result
+    Args:
+        pred_list (sequence): Prediction csv file list.
+        num_workers (int, optional): Number of reader threads. Defaults to 8.
+
+    Returns:
+        index (pd.Index): Image ids (rows).
+        column (str): Prediction column name.
+        preds (np.ndarray): Predictions of each model.
+    """
+    first = pd.read_csv(pred_list[0], index_col=0)
+
+    def _read(f):
+        pred = pd.read_csv(f, index_col=0, usecols=[0, 1], dtype={first.columns[0]: np.float32}).iloc[:, 0]
+        assert len(pred) == len(first), f"{f} 의 row 수가 {pred_list[0]} 와 다릅니다"
+        pred = pred.reindex(first.index)
+        assert not pred.isna().any(), f"{f} 의 image id 가 {pred_list[0]} 와 다릅니다"
+        return pred.to_numpy()
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        preds = list(pool.map(_read, pred_list[1:]))
+    preds = np.stack([first.iloc[:, 0].to_numpy(), *preds]).astype(np.int64)
+    return first.index, first.columns[0], preds
 
-    pred_folder_path = Path(pred_folder_path)
-    pred_list = os.listdir(pred_folder_path)
-    pred_list = [pred_folder_path.joinpath(f) for f in pred_list if ((f[-4:] == ".csv") & (f[0] != "_"))]
-    weights = weights if weights else [1] * len(pred_list)
 
-    preds = []
+def weighted_vote(preds, weights=None, num_classes=None):
+    """
+    Weighted hard voting as one weighted bincount over (row, class) pairs.
+    Ties go to the tied class voted by the earliest model, so the result only depends on model order.
+
+    Args:
+        preds (np.ndarray): (n_models, n_rows) predicted classes.
+        weights (sequence, optional): Weight for each model. Defaults to None(equal).
+        num_classes (int, optional): Number of classes. Defaults to max prediction + 1.
+
+    Returns:
+        result (np.ndarray): (n_rows,) voting result.
+    """
+    n_models, n_rows = preds.shape
+    num_classes = num_classes or int(preds.max()) + 1
+    weights = np.ones(n_models) if weights is None else np.asarray(weights, dtype=np.float64)
+    assert len(weights) == n_models, f"weights 개수({len(weights)})와 prediction 개수({n_models})가 다릅니다"
+
+    rows = np.arange(n_rows)
+    flat = (rows * num_classes + preds).ravel()
+    scores = np.bincount(flat, weights=np.repeat(weights, n_rows), minlength=n_rows * num_classes)
+    scores = scores.reshape(n_rows, num_classes)
+
+    # first model that voted each (row, class); later models are written first so earlier ones win
+    first_vote = np.full((n_rows, num_classes), n_models)
+    for model_idx in range(n_models - 1, -1, -1):
+        first_vote[rows, preds[model_idx]] = model_idx
+    tied = scores == scores.max(axis=1, keepdims=True)
+    return np.where(tied, first_vote, n_models).argmin(axis=1)
+
+
+def scores_path(csv_path, kind):
+    """
+    Score array saved by `inference.py --save_scores` next to a prediction csv.
+
+    Args:
+        csv_path (str or pathlib.Path): Prediction csv path.
+        kind (str): "logits" or "probs".
+
+    Returns:
+        path (pathlib.Path): {csv stem}.{kind}.npy
+    """
+    csv_path = Path(csv_path)
+    return csv_path.with_name(f"{csv_path.stem}.{kind}.npy")
+
+
+def find_scores(csv_path):
+    """
+    Find the score array of a prediction csv.
+
+    Returns:
+        path (pathlib.Path): Score array path.
+        kind (str): "logits" or "probs".
+    """
+    for kind in SCORE_KINDS:
+        path = scores_path(csv_path, kind)
+        if path.exists():
+            return path, kind
+    raise FileNotFoundError(f"{csv_path} 의 score 파일이 없습니다 (inference.py --save_scores 로 생성)")
+
+
+def soft_vote(pred_list, weights=None, chunk_size=65536):
+    """
+    Weighted soft voting from the saved float16 score arrays, read chunk by chunk through mmap.
+    Logits are turned into probabilities first, so models saved either way can be mixed.
+
+    Args:
+        pred_list (sequence): Prediction csv file list.
+        weights (sequence, optional): Weight for each model. Defaults to None(equal).
+        chunk_size (int, optional): Rows per chunk. Defaults to 65536.
+
+    Returns:
+        result (np.ndarray): (n_rows,) voting result.
+    """
+    arrays = []
     for f in pred_list:
-        df = (pd.read_csv(f, index_col=0)).astype(int)
-        preds.append(df)
-    preds = pd.concat(preds, axis=1)
-
-    ensemble_dict = dict()
-    for idx, row in preds.iterrows():
-        ensemble_dict[idx] = _voting(row)
-    ensemble_result = (pd.DataFrame(pd.Series(ensemble_dict))).reset_index()
-    ensemble_result.columns = [preds.index.name, preds.columns[0]]
+        path, kind = find_scores(f)
+        arrays.append((np.load(path, mmap_mode="r"), kind))
+    n_models = len(arrays)
+    weights = np.ones(n_models) if weights is None else np.asarray(weights, dtype=np.float64)
+    assert len(weights) == n_models, f"weights 개수({len(weights)})와 prediction 개수({n_models})가 다릅니다"
+    n_rows = len(arrays[0][0])
+    for f, (scores, _) in zip(pred_list, arrays):
+        assert scores.shape == arrays[0][0].shape, f"{f} 의 score shape 이 {pred_list[0]} 와 다릅니다"
+
+    result = np.empty(n_rows, dtype=np.int64)
+    for start in range(0, n_rows, chunk_size):
+        total = 0
+        for weight, (scores, kind) in zip(weights, arrays):
+            chunk = scores[start : start + chunk_size].astype(np.float32)
+            if kind == "logits":
+                chunk = np.exp(chunk - chunk.max(axis=1, keepdims=True))
+                chunk /= chunk.sum(axis=1, keepdims=True)
+            total = total + weight * chunk
+        result[start : start + chunk_size] = total.argmax(axis=1)
+    return result
+
+
+def ensemble_preds(pred_folder_path, save_path, weights=None, return_result=False, num_workers=8, soft=False):
+    """
+    Save and get voting result from predictions.
+
+    Args:
+        pred_folder_path (list): Folder directory contains pred csv files.
+        save_path (str or pathlib.Path): Voting result save path.
+        weights (sequence): Weight for each prediction(sorted by file name). Defaults to None.
+        return_result (bool): Wheter return voting result.
+        num_workers (int, optional): Number of csv reader threads. Defaults to 8.
+        soft (bool, optional): Soft voting from the saved score arrays. Defaults to False.
+
+    Returns:
+        ensemble_result(pd.DataFrame): Voting result.
+    """
+    # a previous voting result in the same folder is not a vote
+    pred_list = list_preds(pred_folder_path, exclude=save_path)
+    if soft:
+        first = pd.read_csv(pred_list[0], index_col=0)
+        index, column = first.index, first.columns[0]
+        result = soft_vote(pred_list, weights)
+    else:
+        index, column, preds = read_preds(pred_list, num_workers=num_workers)
+        result = weighted_vote(preds, weights)
+    ensemble_result = pd.DataFrame({index.name: index, column: result})
 
     ensemble_result.to_csv(save_path, index=False)
 